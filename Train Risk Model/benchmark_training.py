@@ -0,0 +1,209 @@
+# benchmark_training.py
+# Per-cohort cost profile of train_risk_models_all.py: extraction, fit, calibration,
+# memory and model quality in one comparable table.
+#
+#   python benchmark_training.py                         # every sheet of Grade_*.xlsx in this folder
+#   python benchmark_training.py --synthetic 1000,5000,20000 --items 10,40
+#   RISK_TUNE=1 python benchmark_training.py --out bench_tuned.csv
+#   RISK_ADAPTIVE=1 RISK_POOLED=subject python benchmark_training.py
+#
+# Synthetic cohorts are raw sheets with random 0/1 items (no DOMAIN_CONFIG entry, so every
+# item goes through auto-detection), which makes fit time vs. students × features easy to read.
+#
+# Timings come from an untraced run; peak memory from a second, tracemalloc'd run with
+# RISK_N_JOBS forced to 1, because tracing slows Python code unevenly and cannot see
+# joblib worker processes. A parallel RISK_TUNE search holds about one extra fit per worker.
+
+import argparse, time, tracemalloc
+import numpy as np
+import pandas as pd
+
+import train_risk_models_all as trm
+
+
+def synthetic_sheet(n_students, n_items, seed=0):
+    """Raw sheet in the workbook layout: demo columns + n_items binary items driven by one ability."""
+    rng = np.random.default_rng(seed)
+    ability = rng.normal(0.0, 1.0, n_students)
+    difficulty = rng.normal(0.0, 1.0, n_items)
+    items = (ability[:, None] - difficulty[None, :] + rng.logistic(0, 1, (n_students, n_items))) > 0
+    df = pd.DataFrame(items.astype(int), columns=[f"Item {j+1}" for j in range(n_items)])
+    df.insert(0, "ScRN", [f"Sc{i:03d}" for i in rng.integers(1, 200, n_students)])
+    df.insert(1, "StRN", [f"S_{i:07d}" for i in range(n_students)])
+    df.insert(2, "Gender", rng.choice(["ذكر", "انثى"], n_students))
+    df.insert(3, "Governate", rng.choice(["بيروت", "جبل لبنان", "الشمال", "الجنوب", "البقاع", "عكار"], n_students))
+    return df
+
+
+def train_cohort(X, y, feat_names):
+    """The per-cohort path of train_risk_models_all.main(): RISK_TUNE search, RISK_ADAPTIVE cap, CV fit."""
+    cap = trm.ADAPTIVE_MAX_TRAIN if trm.ADAPTIVE_SUBSAMPLE else None
+    tuning = trm.tune_cohort(X, y, cap) if trm.TUNE_HYPERPARAMS else None
+    params = tuning["params"] if tuning else None
+    t0 = time.perf_counter()
+    train_cap, _ = trm.learning_curve_cap(X, y, params) if trm.ADAPTIVE_SUBSAMPLE else (None, None)
+    adaptive_s = time.perf_counter() - t0
+    res = trm.train_one_cohort(X, y, feat_names, cv_splits=5, params=params, max_train=train_cap)
+    return tuning, train_cap, adaptive_s, res
+
+
+def peak_memory_mb(fn):
+    """tracemalloc peak (MB) of fn(), with every fit kept in this process so it is traced."""
+    n_jobs, trm.N_JOBS = trm.N_JOBS, 1
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+        trm.N_JOBS = n_jobs
+
+
+def profile_cohort(name, read_fn, file_name, sheet, memory=True):
+    """Time read + extract_features + per-cohort training for one cohort.
+
+    Returns (table row, cohort tuple for pooling or None).
+    """
+    row = {"cohort": name}
+
+    t0 = time.perf_counter()
+    df_raw = read_fn()
+    row["read_s"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    parsed = trm.extract_features(df_raw, file_name, sheet)
+    row["extract_s"] = time.perf_counter() - t0
+    if parsed is None:
+        row["note"] = "no features"
+        return row, None
+    X, y, meta, feat_names = parsed
+    row.update(n_students=len(y), n_features=X.shape[1], pos_rate=float(y.mean()))
+
+    t0 = time.perf_counter()
+    tuning, train_cap, adaptive_s, res = train_cohort(X, y, feat_names)
+    row["train_s"] = time.perf_counter() - t0
+    if memory:
+        row["peak_mem_mb"] = peak_memory_mb(lambda: train_cohort(X, y, feat_names))
+
+    if tuning:
+        row["tune_s"] = tuning["search_seconds"]
+    if trm.ADAPTIVE_SUBSAMPLE:
+        row.update(adaptive_s=adaptive_s, train_cap=train_cap)
+    cohort = (file_name, sheet, X, y, meta, feat_names)
+    if res is None:
+        row["note"] = "heuristic (not modelled)"
+        return row, cohort
+    _, metrics, _ = res
+    folds = metrics["folds"]
+    # per fold: calib_seconds = the CalibratedClassifierCV fit (3 inner logistic fits + the
+    # sigmoid/isotonic step); fit_seconds = one bare logistic fit on the same training rows
+    # (the refit train_one_cohort reads coefficients from). Calibration overhead = the difference.
+    model_fit = float(np.mean([f["calib_seconds"] for f in folds]))
+    base_fit = float(np.mean([f["fit_seconds"] for f in folds]))
+    row.update(
+        model_fit_s_per_fold=model_fit,
+        base_fit_s_per_fold=base_fit,
+        calib_overhead_s_per_fold=model_fit - base_fit,
+        auc=metrics["auc_mean"],
+        brier=metrics["brier_mean"],
+    )
+    return row, cohort
+
+
+def profile_pool(name, members, memory=True):
+    """Time train_pooled() over one RISK_POOLED pool; returns one table row."""
+    row = {"cohort": f"pool: {name} ({len(members)} cohorts)",
+           "n_students": sum(len(c[3]) for c in members)}
+    t0 = time.perf_counter()
+    res, pool = trm.train_pooled(members, cv_splits=5)
+    row["train_s"] = time.perf_counter() - t0
+    if memory:
+        row["peak_mem_mb"] = peak_memory_mb(lambda: trm.train_pooled(members, cv_splits=5))
+    if pool is None:
+        row["note"] = "pool not modelled"
+        return row
+    row.update(n_features=pool["n_features"], pos_rate=float(np.mean([c[3].mean() for c in members])),
+               auc=pool["auc_mean"], brier=pool["brier_mean"])
+    return row
+
+
+def median_row(runs):
+    runs = pd.DataFrame(runs)
+    row = runs.iloc[0].to_dict()
+    row.update(runs.median(numeric_only=True).to_dict())
+    return row
+
+
+def workbook_cohorts():
+    for file in trm.GRADE_FILES:
+        xls = pd.ExcelFile(file)
+        for sheet in xls.sheet_names:
+            yield f"{file} / {sheet}", (lambda x=xls, s=sheet: pd.read_excel(x, sheet_name=s)), file, sheet
+
+
+def synthetic_cohorts(sizes, items):
+    for n in sizes:
+        for k in items:
+            sheet = f"Synthetic n={n} items={k}"
+            yield sheet, (lambda n=n, k=k: synthetic_sheet(n, k)), "Grade_1.xlsx", sheet
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-cohort training cost profile")
+    ap.add_argument("--synthetic", help="comma-separated cohort sizes; benchmark synthetic cohorts instead of workbooks")
+    ap.add_argument("--items", default="20", help="comma-separated item counts for synthetic cohorts")
+    ap.add_argument("--repeat", type=int, default=1, help="runs per cohort; the table keeps the median")
+    ap.add_argument("--no-mem", action="store_true", help="skip the separate tracemalloc run (halves the runtime)")
+    ap.add_argument("--out", default=str(trm.OUT_DIR / "benchmark_training.csv"))
+    args = ap.parse_args()
+    memory = not args.no_mem
+
+    flags = [f for f, on in [("RISK_TUNE", trm.TUNE_HYPERPARAMS), ("RISK_ADAPTIVE", trm.ADAPTIVE_SUBSAMPLE)] if on]
+    if trm.POOLED_MODE in ("subject", "global"):
+        flags.append(f"RISK_POOLED={trm.POOLED_MODE}")
+    print(f"Training path: {', '.join(flags) or 'default per-cohort'}")
+    if trm.POOLED_MODE in ("subject", "global"):
+        print("  cohort rows time the per-cohort fits; 'pool:' rows time train_pooled over each pool")
+
+    if args.synthetic:
+        cohorts = list(synthetic_cohorts([int(v) for v in args.synthetic.split(",")],
+                                         [int(v) for v in args.items.split(",")]))
+    else:
+        cohorts = list(workbook_cohorts())
+
+    rows, pools = [], {}
+    for name, read_fn, file_name, sheet in cohorts:
+        runs = [profile_cohort(name, read_fn, file_name, sheet, memory) for _ in range(args.repeat)]
+        rows.append(median_row([r for r, _ in runs]))
+        if runs[-1][1] is not None:
+            pools.setdefault(trm.pool_name(runs[-1][1][4]), []).append(runs[-1][1])
+        print(f"  {name}: {rows[-1].get('train_s', 0.0):.2f}s")
+
+    n_cohort_rows = len(rows)
+    if trm.POOLED_MODE in ("subject", "global"):
+        for name, members in pools.items():
+            rows.append(median_row([profile_pool(name, members, memory) for _ in range(args.repeat)]))
+            print(f"  {rows[-1]['cohort']}: {rows[-1]['train_s']:.2f}s")
+
+    table = pd.DataFrame(rows)
+    if table.empty:
+        print("No cohorts found.")
+        return
+    if "train_s" in table:
+        per_cohort = table.index < n_cohort_rows   # pool rows redo the same students; keep them out of the shares
+        table["share_of_train"] = table["train_s"].where(per_cohort) / table.loc[per_cohort, "train_s"].sum()
+        table = table.sort_values("train_s", ascending=False)
+    cols = ["cohort", "n_students", "n_features", "pos_rate", "read_s", "extract_s", "train_s",
+            "share_of_train", "tune_s", "adaptive_s", "train_cap", "model_fit_s_per_fold", "base_fit_s_per_fold",
+            "calib_overhead_s_per_fold",
+            "peak_mem_mb", "auc", "brier", "note"]
+    table = table[[c for c in cols if c in table.columns]]
+    table.to_csv(args.out, index=False, encoding="utf-8-sig")
+
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.4f}".format):
+        print(table.to_string(index=False))
+    print(f"Saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
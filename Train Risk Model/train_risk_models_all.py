@@ -1,14 +1,18 @@
 # train_risk_models_all.py
 # Models cohorts for Grades 1–3 and writes risk CSVs + metrics (UTF-8 BOM).
 
-import os, re, json, warnings, inspect
+import os, re, json, time, shutil, hashlib, warnings, inspect
 from pathlib import Path
 import numpy as np
 import pandas as pd
+from scipy import sparse
 
 from sklearn.preprocessing import OneHotEncoder
+from sklearn.base import BaseEstimator, ClassifierMixin
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import StratifiedKFold
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingGridSearchCV)
+from sklearn.model_selection import HalvingGridSearchCV
 from sklearn.calibration import CalibratedClassifierCV
 from sklearn.metrics import roc_auc_score, average_precision_score, brier_score_loss
 
@@ -518,6 +522,45 @@ GRADE_WHITELIST = {1, 2, 3,4,5,6}
 GRADE_FILES = [f"Grade_{i}.xlsx" for i in range(1,7) if os.path.exists(f"Grade_{i}.xlsx")]
 OUT_DIR = Path("data_proc"); OUT_DIR.mkdir(exist_ok=True)
 
+# Per-cohort feature cache: X/y as .npy (memory-mapped on reuse), meta as Parquet.
+# Bump FEATURE_CODE_VERSION whenever extract_features() changes what it returns.
+CACHE_DIR = OUT_DIR / "feature_cache"
+USE_FEATURE_CACHE = os.environ.get("RISK_FEATURE_CACHE", "1") != "0"
+FEATURE_CODE_VERSION = 1
+
+# Model configuration. DEFAULT_PARAMS reproduces the original fixed setup; with
+# RISK_TUNE=1 each cohort instead searches TUNE_GRID by successive halving.
+DEFAULT_PARAMS = {"C": 1.0, "penalty": "l2", "class_weight": "balanced", "calibration": "sigmoid"}
+TUNE_HYPERPARAMS = os.environ.get("RISK_TUNE", "0") == "1"
+TUNE_GRID = {
+    "C": [0.01, 0.1, 1.0, 10.0],
+    "penalty": ["l1", "l2"],
+    "class_weight": ["balanced", None],
+    "calibration": ["sigmoid", "isotonic"],
+}
+TUNE_FACTOR = 3          # keep 1/3 of the candidates per round, triple the subsample
+TUNE_MIN_SAMPLES = 200   # smallest subsample a candidate is scored on
+N_JOBS = int(os.environ.get("RISK_N_JOBS", "-1"))
+
+# Pooled mode: "subject" fits one model per subject across grades/sheets, "global" one
+# model overall; "" (default) keeps one model per file×sheet.
+POOLED_MODE = os.environ.get("RISK_POOLED", "").strip().lower()
+
+# Adaptive subsampling (RISK_ADAPTIVE=1): grow a stratified training subsample until held-out
+# AUC/Brier stop improving, then train every CV fold on at most that many students.
+ADAPTIVE_SUBSAMPLE = os.environ.get("RISK_ADAPTIVE", "0") == "1"
+ADAPTIVE_START = 2000        # first learning-curve size
+ADAPTIVE_GROWTH = 2          # size multiplier per step
+ADAPTIVE_TOL = 0.002         # plateau = AUC gain and Brier drop both below this
+ADAPTIVE_HOLDOUT = 5000      # cap on the fixed validation split
+ADAPTIVE_MAX_TRAIN = 64000   # hard ceiling on students per fit, plateau or not
+
+# Per-student explanations: how many top risk-driving domains to keep per student.
+TOP_K_DRIVERS = 3
+
+# Risk histogram resolution for risk_hist_by_region_grade_subject.csv (bin b = [b, b+1)/RISK_HIST_BINS).
+RISK_HIST_BINS = 100
+
 def normalize_region(g):
     if pd.isna(g): return "Unknown"
     m = str(g).strip()
@@ -559,13 +602,25 @@ def get_feature_names(ohe, input_features):
         return list(ohe.get_feature_names_out(input_features))
     return list(ohe.get_feature_names(input_features))
 
-def make_calibrator(base):
+def make_calibrator(base, method="sigmoid"):
     """Create CalibratedClassifierCV across sklearn API changes."""
     sig = inspect.signature(CalibratedClassifierCV.__init__)
     if "estimator" in sig.parameters:
-        return CalibratedClassifierCV(estimator=base, cv=3, method="sigmoid")
+        return CalibratedClassifierCV(estimator=base, cv=3, method=method)
+    else:
+        return CalibratedClassifierCV(base_estimator=base, cv=3, method=method)
+
+def make_logreg(params):
+    """LogisticRegression for a params dict (see DEFAULT_PARAMS), across sklearn API changes."""
+    l1 = params["penalty"] == "l1"
+    kw = dict(C=params["C"], class_weight=params["class_weight"], max_iter=1000,
+              solver="liblinear" if l1 else "lbfgs")
+    if inspect.signature(LogisticRegression.__init__).parameters["penalty"].default == "deprecated":
+        if l1:
+            kw["l1_ratio"] = 1.0   # sklearn >= 1.8 selects the penalty through l1_ratio
     else:
-        return CalibratedClassifierCV(base_estimator=base, cv=3, method="sigmoid")
+        kw["penalty"] = params["penalty"]
+    return LogisticRegression(**kw)
 
 def extract_features(df_raw, file_name, sheet):
     """Return X (np.array), y (np.array), meta (DataFrame), feat_names (list) or None."""
@@ -663,10 +718,187 @@ def extract_features(df_raw, file_name, sheet):
 
     return X, y, meta, feat_names
 
-def train_one_cohort(X, y, feat_names, cv_splits=5):
+# ----------------- feature cache -----------------
+_WORKBOOK_HASHES = {}
+META_ID_COLS = ["student_id", "school_id", "region", "subject", "modality", "sheet", "file"]
+
+def normalize_meta(meta):
+    """Ids and dimensions as pandas "string" (mixed int/str ids are not Parquet-safe), so
+    cached and uncached cohorts have the same schema."""
+    return meta.astype({c: "string" for c in META_ID_COLS if c in meta.columns})
+
+def workbook_hash(path):
+    """SHA-1 of the workbook bytes, computed once per run."""
+    key = os.path.abspath(path)
+    if key not in _WORKBOOK_HASHES:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _WORKBOOK_HASHES[key] = h.hexdigest()
+    return _WORKBOOK_HASHES[key]
+
+def cohort_cache_key(file_name, sheet):
+    """Cache key: workbook content + sheet + its DOMAIN_CONFIG entry + feature-code version."""
+    payload = json.dumps({
+        "workbook": workbook_hash(file_name),
+        "sheet": sheet,
+        "config": DOMAIN_CONFIG.get((file_name, sheet)),
+        "grades": sorted(GRADE_WHITELIST) if GRADE_WHITELIST is not None else None,
+        "version": FEATURE_CODE_VERSION,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+def save_cached_features(path, parsed):
+    """Write one cohort to `path` (a directory). `None` is cached too, as an empty marker."""
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    if parsed is None:
+        (tmp / "EMPTY").touch()
+    else:
+        X, y, meta, feat_names = parsed
+        np.save(tmp / "X.npy", np.ascontiguousarray(X, dtype=np.float64))
+        np.save(tmp / "y.npy", np.asarray(y, dtype=np.int64))
+        normalize_meta(meta).to_parquet(tmp / "meta.parquet", index=False)
+        with open(tmp / "features.json", "w", encoding="utf-8") as f:
+            json.dump(feat_names, f, ensure_ascii=False)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)   # readers never see a half-written entry
+
+def load_cached_features(path):
+    """Return the cached (X, y, meta, feat_names) or None; X and y are read-only memmaps.
+
+    np.memmap arrays are pickled by filename when handed to joblib workers, so
+    parallel fits over a cohort share the same pages instead of copying X.
+    """
+    if (path / "EMPTY").exists():
+        return None
+    X = np.load(path / "X.npy", mmap_mode="r")
+    y = np.load(path / "y.npy", mmap_mode="r")
+    meta = pd.read_parquet(path / "meta.parquet")
+    with open(path / "features.json", encoding="utf-8") as f:
+        feat_names = json.load(f)
+    return X, y, meta, feat_names
+
+def load_cohort(xls, file_name, sheet):
+    """extract_features() for one sheet, served from CACHE_DIR when the key matches.
+
+    meta has the same dtypes either way (see normalize_meta).
+    """
+    if not USE_FEATURE_CACHE:
+        parsed = extract_features(pd.read_excel(xls, sheet_name=sheet), file_name, sheet)
+    else:
+        path = CACHE_DIR / cohort_cache_key(file_name, sheet)
+        if not path.exists():
+            save_cached_features(path, extract_features(pd.read_excel(xls, sheet_name=sheet), file_name, sheet))
+        parsed = load_cached_features(path)
+    if parsed is None:
+        return None
+    X, y, meta, feat_names = parsed
+    return X, y, normalize_meta(meta), feat_names
+
+# ----------------- hyperparameter search -----------------
+class RiskModel(BaseEstimator, ClassifierMixin):
+    """Calibrated logistic regression exposing DEFAULT_PARAMS keys as estimator params."""
+
+    def __init__(self, C=1.0, penalty="l2", class_weight="balanced", calibration="sigmoid"):
+        self.C = C
+        self.penalty = penalty
+        self.class_weight = class_weight
+        self.calibration = calibration
+
+    def fit(self, X, y):
+        params = {k: getattr(self, k) for k in DEFAULT_PARAMS}
+        self.model_ = make_calibrator(make_logreg(params), method=self.calibration).fit(X, y)
+        self.classes_ = self.model_.classes_
+        return self
+
+    def predict_proba(self, X):
+        return self.model_.predict_proba(X)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+def tune_cohort(X, y, max_resources=None):
+    """Successive-halving search over TUNE_GRID on growing stratified subsamples.
+
+    Scored by Brier loss (rewards both ranking and calibration). Candidates are fitted
+    on N_JOBS processes; a memory-mapped X from the feature cache is shared, not copied.
+    The last round uses at most `max_resources` students (default: the whole cohort).
+    Returns a dict with the chosen params and the search cost, or None if the cohort
+    would not be modelled anyway.
+    """
+    if len(y) < 300 or y.mean() in (0.0, 1.0):
+        return None
+
+    limit = min(len(y), max_resources or len(y))
+    t0 = time.perf_counter()
+    search = HalvingGridSearchCV(
+        RiskModel(), TUNE_GRID,
+        factor=TUNE_FACTOR,
+        resource="n_samples",
+        min_resources=max(TUNE_MIN_SAMPLES, limit // TUNE_FACTOR ** 3),
+        max_resources=limit,
+        cv=3, scoring="neg_brier_score",
+        refit=False, random_state=42, n_jobs=N_JOBS,
+    )
+    search.fit(X, y)
+    return {
+        "params": {k: search.best_params_[k] for k in DEFAULT_PARAMS},
+        "best_brier": float(-search.best_score_),
+        "n_candidates": [int(n) for n in search.n_candidates_],
+        "n_resources": [int(n) for n in search.n_resources_],
+        "n_fits": int(sum(search.n_candidates_) * 3),
+        "search_seconds": round(time.perf_counter() - t0, 3),
+    }
+
+def stratified_subsample(idx, y, size, seed=42):
+    """`size` indices from `idx`, keeping the class balance of y[idx]."""
+    if size >= len(idx):
+        return idx
+    sub, _ = train_test_split(idx, train_size=size, stratify=y[idx], random_state=seed)
+    return np.sort(sub)
+
+def learning_curve_cap(X, y, params=None):
+    """Training size beyond which the model stops improving, or None to use every student.
+
+    Fits on stratified subsamples of ADAPTIVE_START, ×ADAPTIVE_GROWTH, … students, scoring
+    each on one fixed stratified holdout, and stops once AUC gain and Brier drop are both
+    under ADAPTIVE_TOL (or ADAPTIVE_MAX_TRAIN is reached). Returns (cap, curve).
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    n = len(y)
+    if n < 2 * ADAPTIVE_START or y.mean() in (0.0, 1.0):
+        return None, []
+
+    pool, hold = train_test_split(np.arange(n), test_size=min(ADAPTIVE_HOLDOUT, n // 5),
+                                  stratify=y, random_state=42)
+    limit = min(len(pool), ADAPTIVE_MAX_TRAIN)
+    curve, size = [], ADAPTIVE_START
+    while size < limit:
+        sub = stratified_subsample(pool, y, size)
+        t0 = time.perf_counter()
+        clf = make_calibrator(make_logreg(params), method=params["calibration"]).fit(X[sub], y[sub])
+        p = clf.predict_proba(X[hold])[:, 1]
+        curve.append({
+            "n": int(size),
+            "auc": float(roc_auc_score(y[hold], p)),
+            "brier": float(brier_score_loss(y[hold], p)),
+            "fit_seconds": round(time.perf_counter() - t0, 4),
+        })
+        if len(curve) > 1:
+            prev, cur = curve[-2], curve[-1]
+            if cur["auc"] - prev["auc"] < ADAPTIVE_TOL and prev["brier"] - cur["brier"] < ADAPTIVE_TOL:
+                return int(size), curve
+        size *= ADAPTIVE_GROWTH
+    return (ADAPTIVE_MAX_TRAIN if len(pool) > ADAPTIVE_MAX_TRAIN else None), curve
+
+def train_one_cohort(X, y, feat_names, cv_splits=5, params=None, max_train=None):
     # require enough size and class balance
     if len(y) < 300 or y.mean() in (0.0, 1.0):
         return None
+    params = {**DEFAULT_PARAMS, **(params or {})}
 
     skf = StratifiedKFold(n_splits=cv_splits, shuffle=True, random_state=42)
     oof = np.zeros(len(y))
@@ -674,16 +906,20 @@ def train_one_cohort(X, y, feat_names, cv_splits=5):
     mets = []
 
     for fold, (tr, te) in enumerate(skf.split(X, y)):
-        base = LogisticRegression(max_iter=1000, class_weight="balanced", solver="lbfgs")
+        if max_train:
+            tr = stratified_subsample(tr, y, max_train, seed=fold)   # every student is still scored
+        base = make_logreg(params)
         # Create calibrator with correct kw for your sklearn version
+        t0 = time.perf_counter()
         try:
-            clf = make_calibrator(base)
+            clf = make_calibrator(base, method=params["calibration"])
             clf.fit(X[tr], y[tr])
             p = clf.predict_proba(X[te])[:, 1]
         except Exception:
             # fallback: uncalibrated logistic
             base.fit(X[tr], y[tr])
             p = base.predict_proba(X[te])[:, 1]
+        t1 = time.perf_counter()
 
         oof[te] = p
 
@@ -691,12 +927,15 @@ def train_one_cohort(X, y, feat_names, cv_splits=5):
         base.fit(X[tr], y[tr])
         coef_vec = getattr(base, "coef_", np.zeros((1, len(feat_names))))[0]
         coefs[fold, :] = coef_vec
+        t2 = time.perf_counter()
 
         mets.append({
             "fold": int(fold),
             "auc": float(roc_auc_score(y[te], p)),
             "avg_precision": float(average_precision_score(y[te], p)),
             "brier": float(brier_score_loss(y[te], p)),
+            "calib_seconds": round(t1 - t0, 4),   # calibrated fit (3 inner fits + sigmoid/isotonic)
+            "fit_seconds": round(t2 - t1, 4),     # single plain logistic fit
         })
 
     metrics = {
@@ -710,27 +949,201 @@ def train_one_cohort(X, y, feat_names, cv_splits=5):
     coef_mean = dict(zip(feat_names, coefs.mean(axis=0).tolist()))
     return oof, metrics, coef_mean
 
-# ----------------- run over all usable sheets -----------------
-all_student_risks = []
-all_metrics = []
-all_coefs = []
+# ----------------- pooled multi-cohort model -----------------
+def domain_features(X, feat_names):
+    """Roll item features up to one mean per domain ('<domain>__pct'); keep region/gender dummies."""
+    groups, demo = {}, []
+    for j, f in enumerate(feat_names):
+        if f.startswith(("gender_", "region_")):
+            demo.append(j)
+        else:
+            groups.setdefault(f.split("__", 1)[0], []).append(j)
+    dom_names = [f"{d}__pct" for d in groups]
+    D = np.column_stack([X[:, idx].mean(axis=1) for idx in groups.values()] + [X[:, demo]])
+    return D, dom_names + [feat_names[j] for j in demo], len(dom_names)
 
-for file in GRADE_FILES:
-    try:
-        xls = pd.ExcelFile(file)
-    except Exception as e:
-        print(f"Skip {file}: {e}")
-        continue
+def train_pooled(cohorts, cv_splits=5):
+    """Fit one sparse logistic model over several cohorts.
+
+    Columns: shared domain-level features (+ region/gender), a one-hot cohort indicator,
+    and cohort × domain interactions, so each cohort keeps its own slopes while small
+    cohorts borrow strength from the rest. Returns ({(file, sheet): (oof, metrics, coef_mean)}
+    in the same shape as train_one_cohort(), pool-level metrics), or ({}, None) if the pool
+    cannot be modelled. Cohort metrics only carry a summary of the pool under "pool".
+    """
+    parts = [domain_features(X, feat_names) for _, _, X, _, _, feat_names in cohorts]
+    vocab = {n: i for i, n in enumerate(sorted({n for _, names, _ in parts for n in names}))}
+    n_shared, K = len(vocab), len(cohorts)
+    inter_off = n_shared + K + np.concatenate([[0], np.cumsum([nd for _, _, nd in parts])])
 
-    for sheet in xls.sheet_names:
+    blocks, ys, cids = [], [], []
+    for k, ((D, names, n_dom), (_, _, _, y, _, _)) in enumerate(zip(parts, cohorts)):
+        n = len(y)
+        shared = sparse.csr_matrix((D.ravel(), (np.repeat(np.arange(n), D.shape[1]),
+                                                np.tile([vocab[c] for c in names], n))),
+                                   shape=(n, n_shared))
+        indicator = sparse.csr_matrix((np.ones(n), (np.arange(n), np.full(n, k))), shape=(n, K))
+        inter = sparse.csr_matrix(D[:, :n_dom])
+        blocks.append(sparse.hstack([
+            shared, indicator,
+            sparse.csr_matrix((n, inter_off[k] - n_shared - K)), inter,
+            sparse.csr_matrix((n, inter_off[-1] - inter_off[k + 1])),
+        ], format="csr"))
+        ys.append(np.asarray(y))
+        cids.append(np.full(n, k))
+    Xp = sparse.vstack(blocks, format="csr")
+    Xp.eliminate_zeros()
+    y, cid = np.concatenate(ys), np.concatenate(cids)
+
+    if len(y) < 300 or y.mean() in (0.0, 1.0):
+        return {}, None
+
+    # stratify on cohort × outcome when every stratum can fill all folds
+    strata = cid * 2 + y
+    if np.bincount(strata).min(initial=0) < cv_splits or len(np.unique(strata)) < 2:
+        strata = y
+    skf = StratifiedKFold(n_splits=cv_splits, shuffle=True, random_state=42)
+    oof = np.zeros(len(y))
+    coefs = np.zeros((cv_splits, Xp.shape[1]))
+    mets = []
+    for fold, (tr, te) in enumerate(skf.split(np.zeros(len(y)), strata)):
+        base = make_logreg(DEFAULT_PARAMS)
         try:
-            df_raw = pd.read_excel(file, sheet_name=sheet)
-            parsed = extract_features(df_raw, file, sheet)
-            if parsed is None:
-                continue
-            X, y, meta, feat_names = parsed
+            clf = make_calibrator(base, method=DEFAULT_PARAMS["calibration"])
+            clf.fit(Xp[tr], y[tr])
+            p = clf.predict_proba(Xp[te])[:, 1]
+        except Exception:
+            base.fit(Xp[tr], y[tr])
+            p = base.predict_proba(Xp[te])[:, 1]
+        oof[te] = p
+        base.fit(Xp[tr], y[tr])
+        coefs[fold, :] = base.coef_[0]
+        mets.append({
+            "fold": int(fold),
+            "auc": float(roc_auc_score(y[te], p)),
+            "avg_precision": float(average_precision_score(y[te], p)),
+            "brier": float(brier_score_loss(y[te], p)),
+        })
+    w = coefs.mean(axis=0)
+    pool = {
+        "n": int(len(y)), "n_cohorts": int(K), "n_features": int(Xp.shape[1]),
+        "auc_mean": float(np.mean([m["auc"] for m in mets])),
+        "ap_mean": float(np.mean([m["avg_precision"] for m in mets])),
+        "brier_mean": float(np.mean([m["brier"] for m in mets])),
+        "folds": mets,
+    }
+    summary = {"name": pool_name(cohorts[0][4]), "mode": POOLED_MODE,
+               "auc_mean": pool["auc_mean"], "brier_mean": pool["brier_mean"]}
+
+    out = {}
+    for k, ((_, names, n_dom), (file, sheet, _, _, _, _)) in enumerate(zip(parts, cohorts)):
+        m = cid == k
+        yk, pk = y[m], oof[m]
+        both = 0.0 < yk.mean() < 1.0
+        metrics = {
+            "n": int(m.sum()),
+            "pos_rate": float(yk.mean()),
+            "auc_mean": float(roc_auc_score(yk, pk)) if both else None,
+            "ap_mean": float(average_precision_score(yk, pk)) if both else None,
+            "brier_mean": float(brier_score_loss(yk, pk)),
+            "model": "pooled",
+            "pool": summary,   # full pool metrics: top-level "pooled" in risk_model_metrics.json
+        }
+        # effective slope for this cohort = shared weight (+ its interaction for domain features)
+        coef_mean = {c: float(w[vocab[c]]) for c in names}
+        for i, c in enumerate(names[:n_dom]):
+            coef_mean[c] += float(w[inter_off[k] + i])
+        out[(file, sheet)] = (pk, metrics, coef_mean)
+    return out, pool
 
-            res = train_one_cohort(X, y, feat_names, cv_splits=5)
+def pool_name(meta):
+    return meta["subject"].iloc[0] if POOLED_MODE == "subject" else "All"
+
+# ----------------- per-student risk drivers -----------------
+def feature_to_domain(raw):
+    """Feature name -> domain label (same mapping as frontend/utils/stats.py)."""
+    s = str(raw)
+    if s.startswith("region_"):
+        return "Region"
+    if s.startswith("gender_"):
+        return "Gender"
+    if "__" in s:
+        return s.split("__", 1)[0]
+    return re.sub(r"Unnamed:\s*\d+", "Item", s)
+
+def student_drivers(X, feat_names, coef, k=TOP_K_DRIVERS):
+    """Top-k domains pushing each student's risk up, in one vectorized pass.
+
+    Contribution of feature j for student i is coef_j × (x_ij − mean_j), summed per domain.
+    Centring on the cohort mean makes a missed item count toward risk rather than as zero.
+    Returns (domains, contribs), both (n, k); slots without a positive contribution are None/NaN.
+    """
+    X = np.asarray(X, dtype=float)
+    w = np.array([coef.get(f, 0.0) for f in feat_names])
+    domains, inv = np.unique([feature_to_domain(f) for f in feat_names], return_inverse=True)
+    M = np.zeros((len(feat_names), len(domains)))
+    M[np.arange(len(feat_names)), inv] = 1.0
+    C = ((X - X.mean(axis=0)) * w) @ M              # (n_students, n_domains)
+
+    k = min(k, C.shape[1])
+    top = np.argpartition(-C, k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(C, top, 1), axis=1), 1)
+    contribs = np.take_along_axis(C, top, 1)
+    names = domains[top].astype(object)
+    names[contribs <= 0] = None
+    contribs[contribs <= 0] = np.nan
+    return names, contribs
+
+# ----------------- run over all usable sheets -----------------
+def main():
+    all_student_risks = []
+    all_metrics = []
+    all_coefs = []
+    all_drivers = []
+
+    cohorts = []   # (file, sheet, X, y, meta, feat_names)
+    for file in GRADE_FILES:
+        try:
+            xls = pd.ExcelFile(file)
+        except Exception as e:
+            print(f"Skip {file}: {e}")
+            continue
+
+        for sheet in xls.sheet_names:
+            try:
+                parsed = load_cohort(xls, file, sheet)
+                if parsed is not None:
+                    cohorts.append((file, sheet) + tuple(parsed))
+            except Exception as e:
+                print(f"Skip {file} / {sheet}: {e}")
+
+    pooled, pool_metrics = {}, {}
+    if POOLED_MODE in ("subject", "global"):
+        pools = {}
+        for c in cohorts:
+            pools.setdefault(pool_name(c[4]), []).append(c)
+        for name, members in pools.items():
+            try:
+                res, pool = train_pooled(members, cv_splits=5)
+                pooled.update(res)
+                if pool is not None:
+                    pool_metrics[name] = pool
+            except Exception as e:
+                print(f"Skip pooled model {name}: {e}")
+            for key in {(f, s) for f, s, *_ in members} - pooled.keys():
+                print(f"Pooled model {name}: {key[0]} / {key[1]} falls back to per-cohort training")
+
+    for file, sheet, X, y, meta, feat_names in cohorts:
+        try:
+            tuning, curve = None, None
+            if (file, sheet) in pooled:
+                res = pooled[(file, sheet)]
+            else:
+                # under RISK_ADAPTIVE the search is held to the same ceiling as the final fit
+                tuning = tune_cohort(X, y, ADAPTIVE_MAX_TRAIN if ADAPTIVE_SUBSAMPLE else None) if TUNE_HYPERPARAMS else None
+                params = tuning["params"] if tuning else None
+                cap, curve = learning_curve_cap(X, y, params) if ADAPTIVE_SUBSAMPLE else (None, None)
+                res = train_one_cohort(X, y, feat_names, cv_splits=5, params=params, max_train=cap)
             if res is None:
                 # fallback: wrong-rate ranking (transparent)
                 wrong = 1.0 - X.mean(axis=1)
@@ -760,6 +1173,10 @@ for file in GRADE_FILES:
                 "subject": meta["subject"].iloc[0],
                 "modality": meta["modality"].iloc[0],
             })
+            if tuning:
+                metrics["tuning"] = tuning
+            if curve:
+                metrics["adaptive"] = {"train_cap": cap, "learning_curve": curve}
             all_metrics.append(metrics)
 
             all_coefs.append(pd.DataFrame({
@@ -770,30 +1187,60 @@ for file in GRADE_FILES:
                 "feature": list(coef_mean.keys()),
                 "coef": list(coef_mean.values())
             }))
+
+            Xd, names = (domain_features(X, feat_names)[:2] if (file, sheet) in pooled
+                         else (X, feat_names))
+            top_dom, top_val = student_drivers(Xd, names, coef_mean)
+            drivers = meta[["student_id", "grade", "subject", "modality"]].copy()
+            for i in range(top_dom.shape[1]):
+                drivers[f"driver_{i+1}"] = top_dom[:, i]
+                drivers[f"driver_{i+1}_contrib"] = top_val[:, i].astype(np.float32)
+            all_drivers.append(drivers)
         except Exception as e:
             print(f"Skip {file} / {sheet}: {e}")
 
-# ----------------- write outputs -----------------
-if all_student_risks:
-    risks = pd.concat(all_student_risks, ignore_index=True)
-    risks.to_csv(OUT_DIR / "student_risk_scores.csv", index=False, encoding="utf-8-sig")
-
-    cohort = (risks.groupby(["region","grade","subject"])
-                    .agg(avg_risk=("risk_prob_below","mean"),
-                         pct_students_above80=("risk_prob_below", lambda s: (s>=0.8).mean()),
-                         n_students=("student_id","count"))
-                    .reset_index())
-    cohort["avg_risk"] = (100*cohort["avg_risk"]).round(1)
-    cohort["pct_students_above80"] = (100*cohort["pct_students_above80"]).round(1)
-    cohort.to_csv(OUT_DIR / "risk_by_region_grade_subject.csv", index=False, encoding="utf-8-sig")
-
-if all_metrics:
-    with open(OUT_DIR / "risk_model_metrics.json", "w", encoding="utf-8") as f:
-        json.dump(all_metrics, f, ensure_ascii=False, indent=2)
-
-if all_coefs:
-    coef_df = pd.concat(all_coefs, ignore_index=True)
-    coef_df = coef_df.sort_values(["grade","subject","modality","coef"], ascending=[True,True,True,False])
-    coef_df.to_csv(OUT_DIR / "risk_model_coefficients.csv", index=False, encoding="utf-8-sig")
-
-print("✓ Risk models complete. Files written to data_proc/")
+    # ----------------- write outputs -----------------
+    if all_student_risks:
+        risks = pd.concat(all_student_risks, ignore_index=True)
+        risks.to_csv(OUT_DIR / "student_risk_scores.csv", index=False, encoding="utf-8-sig")
+
+        cohort = (risks.assign(above80=risks["risk_prob_below"] >= 0.8)
+                        .groupby(["region","grade","subject"])
+                        .agg(avg_risk=("risk_prob_below","mean"),
+                             pct_students_above80=("above80","mean"),
+                             n_students=("student_id","count"))
+                        .reset_index())
+        cohort["avg_risk"] = (100*cohort["avg_risk"]).round(1)
+        cohort["pct_students_above80"] = (100*cohort["pct_students_above80"]).round(1)
+        cohort.to_csv(OUT_DIR / "risk_by_region_grade_subject.csv", index=False, encoding="utf-8-sig")
+
+        # threshold-agnostic view: student counts per risk bin, so any "% at or above thr" is a suffix sum
+        p = risks["risk_prob_below"].to_numpy(dtype=float)
+        bins = np.minimum(np.floor(p * RISK_HIST_BINS + 1e-9), RISK_HIST_BINS - 1).astype(int)
+        hist = (risks[["region","grade","subject"]].assign(bin=bins)
+                     .groupby(["region","grade","subject","bin"]).size()
+                     .rename("n").reset_index())
+        hist.to_csv(OUT_DIR / "risk_hist_by_region_grade_subject.csv", index=False, encoding="utf-8-sig")
+
+    if all_metrics:
+        # per-cohort entries; pooled-model CV metrics once per pool (cohorts refer to it by name)
+        with open(OUT_DIR / "risk_model_metrics.json", "w", encoding="utf-8") as f:
+            json.dump({"cohorts": all_metrics, "pooled": pool_metrics}, f, ensure_ascii=False, indent=2)
+
+    if all_coefs:
+        coef_df = pd.concat(all_coefs, ignore_index=True)
+        coef_df = coef_df.sort_values(["grade","subject","modality","coef"], ascending=[True,True,True,False])
+        coef_df.to_csv(OUT_DIR / "risk_model_coefficients.csv", index=False, encoding="utf-8-sig")
+
+    if all_drivers:
+        # columnar + dictionary-encoded: the frontend joins this on student_id/grade/subject/modality
+        # ids as "string" whatever the meta dtypes were, so the Parquet schema is fixed
+        drv = normalize_meta(pd.concat(all_drivers, ignore_index=True))
+        for c in ["subject", "modality"] + [c for c in drv.columns if c.startswith("driver_") and not c.endswith("_contrib")]:
+            drv[c] = drv[c].astype("category")
+        drv.to_parquet(OUT_DIR / "student_risk_drivers.parquet", index=False)
+
+    print("✓ Risk models complete. Files written to data_proc/")
+
+if __name__ == "__main__":
+    main()
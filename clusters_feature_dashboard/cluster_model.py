@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------------
+# Shared GMM fit + High/Medium/Low naming. Used by clusterss.py (and the school pipeline
+# through it) and by the dashboard's interactive re-clustering (frontend/utils/clustering.py),
+# so both name clusters the same way. The frontend image copies this file next to app.py.
+# ----------------------------
+RANDOM_STATE     = 42
+IMBALANCE_RATIO  = 0.20       # if min_count/max_count < 0.20 OR an empty cluster -> collapse
+LOW_Q, HIGH_Q    = 0.33, 0.67 # fallback cutoffs
+LABELS           = ["High", "Medium", "Low"]
+
+def rank_labels(means: pd.Series) -> dict:
+    """Map cluster ids to High/Medium/Low by mean composite: top third High, bottom third Low."""
+    order = means.sort_values(ascending=False).index
+    k = len(order)
+    labels = {}
+    for i, cid in enumerate(order):
+        pos = i / max(k - 1, 1)
+        labels[cid] = "High" if pos < 1/3 else ("Low" if pos > 2/3 else "Medium")
+    return labels
+
+def name_clusters(composite, cid: np.ndarray, k: int) -> np.ndarray:
+    """Label per cluster id (0..k-1) from the mean composite of its rows; empty ids rank last."""
+    means = pd.Series(np.asarray(composite, dtype=float)).groupby(cid).mean()
+    means = means.reindex(range(k), fill_value=-np.inf)
+    names = rank_labels(means)
+    return np.array([names[c] for c in range(k)], dtype=object)
+
+def fit_gmm(X: np.ndarray, k: int, covariance_type: str = "full",
+            random_state: int = RANDOM_STATE, n_init: int = 10, **kw):
+    """Fit a k-component GMM on scaled features; returns (gmm, cluster ids, rows per id)."""
+    from sklearn.mixture import GaussianMixture   # keeps the dashboard's import path light
+    gmm = GaussianMixture(n_components=k, covariance_type=covariance_type,
+                          random_state=random_state, n_init=n_init, **kw)
+    cid = gmm.fit_predict(X)
+    return gmm, cid, np.bincount(cid, minlength=k)
+
+def is_imbalanced(counts: np.ndarray) -> bool:
+    """Collapse rule: an empty cluster, or smallest/largest under IMBALANCE_RATIO."""
+    return bool((counts == 0).any() or counts.min() / counts.max() < IMBALANCE_RATIO)
+
+def percentile_cutoffs(composite) -> tuple:
+    q_low, q_high = np.nanquantile(np.asarray(composite, dtype=float), [LOW_Q, HIGH_Q])
+    return float(q_low), float(q_high)
+
+def percentile_labels(composite, q_low: float, q_high: float) -> np.ndarray:
+    v = np.asarray(composite, dtype=float)
+    return np.select([v <= q_low, v >= q_high], ["Low", "High"], "Medium").astype(object)
@@ -1,8 +1,13 @@
+import hashlib
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from joblib import Parallel, delayed, dump, load
 from sklearn.preprocessing import RobustScaler
-from sklearn.mixture import GaussianMixture
+from sklearn.metrics import silhouette_score
+
+from cluster_model import (RANDOM_STATE, IMBALANCE_RATIO, LOW_Q, HIGH_Q, LABELS,
+                           name_clusters, fit_gmm, is_imbalanced, percentile_cutoffs, percentile_labels)
 
 # ----------------------------
 # CONFIG (edit paths if needed)
@@ -11,10 +16,29 @@ IN_PATH_RG  = Path("agg_region_grade_subject_domain.csv")   # REQUIRED
 IN_PATH_GND = Path("agg_gender_domain.csv")                  # OPTIONAL
 OUT_PATH    = Path("region_grade_clusters_hybrid.csv")
 
-RANDOM_STATE     = 42
+# RANDOM_STATE, IMBALANCE_RATIO, LOW_Q/HIGH_Q and LABELS live in cluster_model.py (shared with the dashboard)
 N_CLUSTERS       = 3
-IMBALANCE_RATIO  = 0.20       # if min_count/max_count < 0.20 OR <3 clusters -> collapse
-LOW_Q, HIGH_Q    = 0.33, 0.67 # fallback cutoffs
+
+# Model selection: instead of a fixed 3-component GMM, fit every (k, covariance type) pair
+# in parallel and keep the best by BIC + silhouette. Winning fits are cached by the hash
+# of the scaled feature matrix, so reruns on unchanged data skip the search.
+MODEL_SELECTION  = False
+K_GRID           = [2, 3, 4, 5]
+COV_TYPES        = ["full", "tied", "diag", "spherical"]
+N_JOBS           = -1
+CACHE_DIR        = Path("cluster_cache")
+
+# Fitted scaler + GMM + label map are saved here; later runs (and new rows) reuse them so
+# labels stay put between data drops. Set REFIT = True to refit and relabel from scratch.
+MODEL_PATH       = Path("region_grade_cluster_model.joblib")
+REFIT            = False
+
+# Stability: refit the clustering on N_BOOTSTRAP row resamples (process pool, N_JOBS) and report
+# how often each row gets its label (label_confidence) plus a row × row co-assignment matrix.
+STABILITY        = False
+N_BOOTSTRAP      = 200
+OUT_STABILITY    = Path("region_grade_cluster_stability.csv")
+OUT_COASSIGN     = Path("region_grade_coassignment.csv")
 
 # Fix common encoding/alias issues in region names
 REGION_MAP = {
@@ -31,47 +55,44 @@ def zscore(x: pd.Series) -> pd.Series:
         return x - x.mean()
     return (x - x.mean()) / (s + 1e-9)
 
-def build_region_features(dfr: pd.DataFrame) -> pd.DataFrame:
-    req = {"region","subject","avg_score","pct_below"}
-    miss = req - set(dfr.columns)
-    if miss:
-        raise ValueError(f"Missing columns in region file: {miss}")
-
-    dfr = dfr.copy()
-    dfr.columns = [c.strip().lower() for c in dfr.columns]
-    if "grade" not in dfr.columns: dfr["grade"] = "All"
-    if "n_students" not in dfr.columns: dfr["n_students"] = np.nan
-
-    dfr["region_canonical"] = dfr["region"].replace(REGION_MAP)
-
+def group_zscore(df: pd.DataFrame, col: str, keys: list) -> pd.Series:
+    """zscore() within each group of `keys`, computed with built-in groupby reductions (no per-group Python call)."""
+    g = df.groupby(keys)[col]
+    centred = df[col] - g.transform("mean")
+    s = g.transform("std", ddof=0)
+    return centred.where((s == 0) | s.isna(), centred / (s + 1e-9))
+
+def build_unit_features(dfr: pd.DataFrame, unit: list) -> pd.DataFrame:
+    """
+    Unit × Grade features from a tidy (unit..., grade, subject[, domain]) table with avg_score,
+    pct_below and n_students. Rows are z-scored within grade × subject across all units, then
+    averaged per unit and grade. Vectorized end to end, so it scales from regions to every school.
+    """
+    keys = unit + ["grade"]
     for c in ["avg_score","pct_below","n_students"]:
         if c in dfr.columns:
             dfr[c] = pd.to_numeric(dfr[c], errors="coerce")
 
     # per-(grade,subject) normalization
-    dfr["z_avg"]  = dfr.groupby(["grade","subject"])["avg_score"].transform(zscore)
+    dfr["z_avg"]  = group_zscore(dfr, "avg_score", ["grade","subject"])
     dfr["pct_ok"] = 100 - dfr["pct_below"]          # higher is better
-    dfr["z_ok"]   = dfr.groupby(["grade","subject"])["pct_ok"].transform(zscore)
+    dfr["z_ok"]   = group_zscore(dfr, "pct_ok", ["grade","subject"])
     dfr["z_subject_strength"] = 0.5*dfr["z_avg"] + 0.5*dfr["z_ok"]
 
     # size signal
     if dfr["n_students"].notna().any():
         dfr["log_n_students"] = np.log1p(dfr["n_students"].clip(lower=0))
-        dfr["z_size"] = dfr.groupby(["grade","subject"])["log_n_students"].transform(zscore)
+        dfr["z_size"] = group_zscore(dfr, "log_n_students", ["grade","subject"])
     else:
         dfr["z_size"] = 0.0
 
-    # aggregate to Region × Grade
-    subj_strength = dfr.pivot_table(
-        index=["region_canonical","grade"],
-        columns="subject",
-        values="z_subject_strength",
-        aggfunc="mean"
-    )
+    # aggregate to Unit × Grade
+    subj_strength = dfr.groupby(keys + ["subject"])["z_subject_strength"].mean().unstack("subject")
+    subj_strength = subj_strength.dropna(axis=1, how="all")
     subj_strength.columns = [f"strength_{s}" for s in subj_strength.columns]
     subj_strength = subj_strength.reset_index()
 
-    agg = dfr.groupby(["region_canonical","grade"]).agg(
+    agg = dfr.groupby(keys).agg(
         mean_z_avg=("z_avg","mean"),
         mean_z_ok=("z_ok","mean"),
         mean_z_size=("z_size","mean"),
@@ -80,7 +101,7 @@ def build_region_features(dfr: pd.DataFrame) -> pd.DataFrame:
         entries=("subject","size"),
     ).reset_index()
 
-    feats = pd.merge(agg, subj_strength, on=["region_canonical","grade"], how="left")
+    feats = pd.merge(agg, subj_strength, on=keys, how="left")
 
     # fill missing subject strengths with 0 (neutral)
     for c in [c for c in feats.columns if c.startswith("strength_")]:
@@ -93,6 +114,20 @@ def build_region_features(dfr: pd.DataFrame) -> pd.DataFrame:
 
     return feats
 
+def build_region_features(dfr: pd.DataFrame) -> pd.DataFrame:
+    req = {"region","subject","avg_score","pct_below"}
+    miss = req - set(dfr.columns)
+    if miss:
+        raise ValueError(f"Missing columns in region file: {miss}")
+
+    dfr = dfr.copy()
+    dfr.columns = [c.strip().lower() for c in dfr.columns]
+    if "grade" not in dfr.columns: dfr["grade"] = "All"
+    if "n_students" not in dfr.columns: dfr["n_students"] = np.nan
+
+    dfr["region_canonical"] = dfr["region"].replace(REGION_MAP)
+    return build_unit_features(dfr, ["region_canonical"])
+
 def build_gender_features(dfg: pd.DataFrame | None) -> pd.DataFrame | None:
     # Optional enrichment for clustering (not included in final columns)
     if dfg is None: return None
@@ -123,10 +158,9 @@ def build_gender_features(dfg: pd.DataFrame | None) -> pd.DataFrame | None:
     pv["gender_gap_ok"]  = ((100 - pv["pct_below_female"]) - (100 - pv["pct_below_male"])) \
                             if ("pct_below_female" in pv and "pct_below_male" in pv) else np.nan
 
-    pv["z_gender_gap_avg"] = pv.groupby(["grade","subject"])["gender_gap_avg"].transform(
-        lambda s: (s - s.mean()) / (s.std(ddof=0)+1e-9))
-    pv["z_gender_gap_ok"]  = pv.groupby(["grade","subject"])["gender_gap_ok"].transform(
-        lambda s: (s - s.mean()) / (s.std(ddof=0)+1e-9))
+    for c in ["gender_gap_avg","gender_gap_ok"]:
+        g = pv.groupby(["grade","subject"])[c]
+        pv[f"z_{c}"] = (pv[c] - g.transform("mean")) / (g.transform("std", ddof=0) + 1e-9)
 
     gfeat = pv.groupby(["region_canonical","grade"]).agg(
         mean_gender_gap_avg=("z_gender_gap_avg","mean"),
@@ -134,38 +168,163 @@ def build_gender_features(dfg: pd.DataFrame | None) -> pd.DataFrame | None:
     ).reset_index()
     return gfeat
 
-def label_with_gmm_or_percentiles(feats: pd.DataFrame) -> pd.DataFrame:
+def matrix_key(X: np.ndarray, *extra) -> str:
+    """Stable hash of a feature matrix (+ any settings that change the fit)."""
+    h = hashlib.sha1(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    h.update(repr((X.shape,) + extra).encode())
+    return h.hexdigest()[:20]
+
+def _fit_candidate(X: np.ndarray, k: int, cov: str) -> dict:
+    gmm, labels, counts = fit_gmm(X, k, cov)
+    used = int((counts > 0).sum())
+    sil = float(silhouette_score(X, labels)) if 1 < used < len(X) else np.nan
+    return {"k": k, "covariance_type": cov, "bic": float(gmm.bic(X)), "silhouette": sil,
+            "balance": float(counts.min() / counts.max()), "clusters_used": used,
+            "model": gmm, "labels": labels}
+
+def select_gmm(X: np.ndarray) -> dict:
+    """
+    Fit K_GRID × COV_TYPES in parallel and pick the winner.
+
+    Candidates that leave a cluster empty or fall under IMBALANCE_RATIO are dropped; the rest
+    are ranked by BIC (lower is better) and silhouette (higher is better), and the lowest rank
+    sum wins. Returns {"best": candidate or None, "table": scores DataFrame}, cached on disk.
+    """
+    key = matrix_key(X, K_GRID, COV_TYPES, RANDOM_STATE, IMBALANCE_RATIO)
+    path = CACHE_DIR / f"gmm_select_{key}.joblib"
+    if path.exists():
+        return load(path)
+
+    cands = Parallel(n_jobs=N_JOBS)(
+        delayed(_fit_candidate)(X, k, cov) for k in K_GRID for cov in COV_TYPES
+    )
+    table = pd.DataFrame([{c: r[c] for c in ["k","covariance_type","bic","silhouette","balance","clusters_used"]}
+                          for r in cands])
+    table["eligible"] = (table["clusters_used"] == table["k"]) & (table["balance"] >= IMBALANCE_RATIO)
+    elig = table[table["eligible"]]
+    table["rank"] = elig["bic"].rank() + elig["silhouette"].rank(ascending=False, na_option="bottom")
+    best = cands[int(table["rank"].idxmin())] if len(elig) else None
+
+    sel = {"best": best, "table": table.sort_values(["rank","bic"], na_position="last").reset_index(drop=True)}
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    dump(sel, path)
+    return sel
+
+def feature_columns(feats: pd.DataFrame) -> list:
     # Build feature matrix (include gender gaps if present, but not required)
     sub_cols = [c for c in feats.columns if c.startswith("strength_")]
     opt_gender = [c for c in ["mean_gender_gap_avg","mean_gender_gap_ok"] if c in feats.columns]
-    X_cols = ["mean_z_avg","mean_z_ok","mean_z_size","composite_overall",
-              "subjects_covered","entries"] + sub_cols + opt_gender
-
+    return ["mean_z_avg","mean_z_ok","mean_z_size","composite_overall",
+            "subjects_covered","entries"] + sub_cols + opt_gender
+
+def fit_cluster_model(feats: pd.DataFrame) -> dict:
+    """
+    Fit scaler + GMM (or percentile cutoffs) on `feats` and freeze the cluster id -> label map.
+    The returned dict is what gets saved to MODEL_PATH and what assign_clusters() consumes.
+    """
+    X_cols = feature_columns(feats)
     scaler = RobustScaler()
     X_scaled = scaler.fit_transform(feats[X_cols].fillna(0.0))
 
-    # Try GMM
-    gmm = GaussianMixture(n_components=N_CLUSTERS, random_state=RANDOM_STATE, n_init=10)
-    labels = gmm.fit_predict(X_scaled)
-    vc = pd.Series(labels).value_counts()
-    imbalanced = (len(vc) < N_CLUSTERS) or ((vc.min() / vc.max()) < IMBALANCE_RATIO)
+    if MODEL_SELECTION:
+        # Search k × covariance type; no eligible candidate -> percentile fallback below
+        sel = select_gmm(X_scaled)
+        print(sel["table"].to_string(index=False))
+        imbalanced = sel["best"] is None
+        gmm = None if imbalanced else sel["best"]["model"]
+        labels = None if imbalanced else sel["best"]["labels"]
+    else:
+        # Try GMM
+        gmm, labels, counts = fit_gmm(X_scaled, N_CLUSTERS)
+        imbalanced = is_imbalanced(counts)
 
+    model = {"columns": X_cols, "n_rows": len(feats),
+             "fitted_at": pd.Timestamp.now().isoformat(timespec="seconds")}
     if not imbalanced:
-        feats["__cid"] = labels
-        # Rank clusters by mean composite to name them
-        means = feats.groupby("__cid")["composite_overall"].mean().sort_values(ascending=False)
-        rank_map = {cid: lab for cid, lab in zip(means.index, ["High","Low","Medium"])}  # order will be remapped later anyway
-        feats["cluster_label"] = feats["__cid"].map(rank_map)
-        feats.drop(columns=["__cid"], inplace=True)
-        return feats
+        # Rank clusters by mean composite to name them; ids without rows still get a label
+        model.update(kind="gmm", scaler=scaler, gmm=gmm,
+                     labels=name_clusters(feats["composite_overall"], labels, gmm.n_components))
+        return model
 
     # Fallback: global percentile thresholds (balanced)
-    q_low, q_high = feats["composite_overall"].quantile([LOW_Q, HIGH_Q])
-    def to_label(v):
-        if v <= q_low: return "Low"
-        if v >= q_high: return "High"
-        return "Medium"
-    feats["cluster_label"] = feats["composite_overall"].apply(to_label)
+    q_low, q_high = percentile_cutoffs(feats["composite_overall"])
+    model.update(kind="percentile", q_low=q_low, q_high=q_high)
+    return model
+
+def assign_clusters(model: dict, feats: pd.DataFrame) -> np.ndarray:
+    """
+    Place rows (region×grade or school×grade features with the model's columns) into the
+    saved clusters. One vectorized transform + predict, no refit, so labels never move.
+    """
+    if model["kind"] == "gmm":
+        X = feats.reindex(columns=model["columns"]).fillna(0.0)
+        cid = model["gmm"].predict(model["scaler"].transform(X))
+        return model["labels"][cid]
+    return percentile_labels(feats["composite_overall"], model["q_low"], model["q_high"])
+
+def load_or_fit_model(feats: pd.DataFrame, path: Path = MODEL_PATH, refit: bool = REFIT) -> dict:
+    """Reuse the saved model unless refit is requested (or nothing usable is saved)."""
+    if path.exists() and not refit:
+        model = load(path)
+        if model["columns"] == feature_columns(feats):
+            return model
+        print(f"Saved model at {path} was fitted on other features (new subject?); refitting")
+    model = fit_cluster_model(feats)
+    dump(model, path)
+    print(f"Saved cluster model to {path.resolve()}")
+    return model
+
+def _bootstrap_run(model: dict, X: np.ndarray, composite: np.ndarray, seed: int):
+    """One resample + refit with the saved model's settings; returns (cluster ids, label codes) for all rows."""
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(X), len(X))
+    if model["kind"] == "gmm":
+        g = model["gmm"]
+        # resamples repeat rows, so give the covariances a little more regularisation
+        gmm, _, _ = fit_gmm(X[idx], g.n_components, g.covariance_type,
+                            random_state=seed, n_init=1, reg_covar=1e-4)
+        cid = gmm.predict(X)
+        names = name_clusters(composite, cid, g.n_components)
+        codes = np.array([LABELS.index(n) for n in names])[cid]
+    else:
+        q_low, q_high = np.quantile(composite[idx], [LOW_Q, HIGH_Q])
+        codes = np.select([composite <= q_low, composite >= q_high], [2, 0], 1)
+        cid = codes
+    return cid, codes
+
+def stability_analysis(model: dict, feats: pd.DataFrame, n_boot: int = N_BOOTSTRAP):
+    """
+    Bootstrap the clustering n_boot times in parallel and summarise it.
+
+    Returns (probs, coassign): probs is rows × LABELS with the share of runs giving each label;
+    coassign[i, j] is the share of runs that put rows i and j in the same cluster. Both come
+    from one-hot matrices, so the consensus is two matrix products instead of a loop over pairs.
+    """
+    X = feats.reindex(columns=model["columns"]).fillna(0.0)
+    X = model["scaler"].transform(X) if model["kind"] == "gmm" else X.to_numpy()
+    composite = feats["composite_overall"].to_numpy(dtype=float)
+
+    seeds = np.random.SeedSequence(RANDOM_STATE).generate_state(n_boot)
+    runs = Parallel(n_jobs=N_JOBS)(
+        delayed(_bootstrap_run)(model, X, composite, int(s)) for s in seeds
+    )
+    cids = np.stack([r[0] for r in runs], axis=1)     # rows × runs
+    codes = np.stack([r[1] for r in runs], axis=1)
+
+    n = len(X)
+    probs = np.stack([(codes == k).mean(axis=1) for k in range(len(LABELS))], axis=1)
+
+    # one column per (run, cluster id): rows sharing a column were co-assigned in that run
+    k_max = int(cids.max()) + 1
+    onehot = np.zeros((n, n_boot * k_max), dtype=np.float32)
+    onehot[np.repeat(np.arange(n), n_boot), (np.arange(n_boot) * k_max + cids).ravel()] = 1.0
+    coassign = (onehot @ onehot.T) / n_boot
+    return probs, coassign
+
+def label_with_gmm_or_percentiles(feats: pd.DataFrame, model: dict = None) -> pd.DataFrame:
+    if model is None:
+        model = fit_cluster_model(feats)
+    feats["cluster_label"] = assign_clusters(model, feats)
     return feats
 
 # ----------------------------
@@ -186,8 +345,24 @@ if __name__ == "__main__":
     except Exception:
         pass  # if gender file problematic, proceed without it
 
-    # 3) Assign labels via GMM or percentile fallback
-    feats = label_with_gmm_or_percentiles(feats)
+    # 3) Assign labels via GMM or percentile fallback (saved model unless REFIT)
+    model = load_or_fit_model(feats)
+    feats = label_with_gmm_or_percentiles(feats, model)
+
+    # 3b) Optional bootstrap stability: confidence per row + co-assignment matrix
+    if STABILITY:
+        probs, coassign = stability_analysis(model, feats)
+        code = feats["cluster_label"].map({l: i for i, l in enumerate(LABELS)}).to_numpy()
+        feats["label_confidence"] = probs[np.arange(len(feats)), code].round(3)
+        stab = feats[["region_canonical","grade","cluster_label","label_confidence"]].copy()
+        for i, l in enumerate(LABELS):
+            stab[f"p_{l}"] = probs[:, i].round(3)
+        stab.to_csv(OUT_STABILITY, index=False)
+        keys = feats["region_canonical"].astype(str) + " | G" + feats["grade"].astype(str)
+        pd.DataFrame(coassign.round(3), index=keys, columns=keys).to_csv(OUT_COASSIGN)
+        print(f"Bootstrap stability ({N_BOOTSTRAP} runs): median confidence "
+              f"{feats['label_confidence'].median():.2f}, {int((feats['label_confidence'] < 0.6).sum())} rows under 0.6")
+        print(f"Saved {OUT_STABILITY.resolve()} and {OUT_COASSIGN.resolve()}")
 
     # 4) Produce final CSV with EXACT columns & sorting you asked for
     # Custom cluster order per grade: High, Low, Medium
@@ -200,6 +375,8 @@ if __name__ == "__main__":
         "composite_overall","mean_z_avg","mean_z_ok","mean_z_size",
         "subjects_covered","entries","strength_Arabic","strength_English","strength_French"
     ]
+    if "label_confidence" in feats.columns:
+        final_cols.append("label_confidence")
 
     # If some subjects have different names/case in your data, normalize here:
     for needed in ["strength_Arabic","strength_English","strength_French"]:
@@ -0,0 +1,97 @@
+import time
+import pandas as pd
+import numpy as np
+from pathlib import Path
+
+import clusterss as cs
+
+# ----------------------------
+# CONFIG (edit paths if needed)
+# ----------------------------
+IN_PATH_SCHOOL = Path("agg_school_grade_subject_domain.csv")   # REQUIRED: from data_processing
+OUT_SCHOOLS    = Path("school_grade_clusters.csv")
+OUT_ROLLUP     = Path("region_grade_school_mix.csv")
+MODEL_PATH     = Path("school_grade_cluster_model.joblib")
+REFIT          = False
+MIN_STUDENTS   = 10   # smaller school × grade cells are labelled but not used to fit the model
+
+LABELS = cs.LABELS
+
+# ----------------------------
+# HELPERS
+# ----------------------------
+def build_school_features(dfs: pd.DataFrame) -> pd.DataFrame:
+    """School × Grade features: same definitions as the region features, z-scored nationally."""
+    req = {"region","school_id","grade","subject","avg_score","pct_below","n_students"}
+    dfs = dfs.copy()
+    dfs.columns = [c.strip().lower() for c in dfs.columns]
+    miss = req - set(dfs.columns)
+    if miss:
+        raise ValueError(f"Missing columns in school file: {miss}")
+
+    dfs["region_canonical"] = dfs["region"].replace(cs.REGION_MAP)
+    dfs["school_id"] = dfs["school_id"].astype(str)
+    feats = cs.build_unit_features(dfs, ["region_canonical","school_id"])
+
+    # students per school × grade: every student sits all domains of a subject, so take the
+    # largest (subject, domain) count rather than summing over rows
+    size = dfs.groupby(["region_canonical","school_id","grade"])["n_students"].max().rename("n_students")
+    feats = feats.merge(size.reset_index(), on=["region_canonical","school_id","grade"], how="left")
+    feats["percentile_within_region"] = (
+        feats.groupby(["region_canonical","grade"])["composite_overall"].rank(pct=True) * 100
+    ).round(1)
+    return feats
+
+def region_rollup(schools: pd.DataFrame) -> pd.DataFrame:
+    """Region × Grade view of the school clusters: school mix and share of students per label."""
+    keys = ["region_canonical","grade"]
+    n = schools["n_students"].fillna(0)
+    base = schools.assign(_w=n, _wc=n * schools["composite_overall"]).groupby(keys).agg(
+        n_schools=("school_id","nunique"),
+        n_students=("_w","sum"),
+        _wc=("_wc","sum"),
+    )
+    base["composite_student_weighted"] = base.pop("_wc") / base["n_students"].replace(0, np.nan)
+
+    schools_by_label = pd.crosstab([schools[k] for k in keys], schools["cluster_label"], normalize="index")
+    students_by_label = schools.pivot_table(index=keys, columns="cluster_label", values="n_students",
+                                            aggfunc="sum", fill_value=0)
+    students_by_label = students_by_label.div(students_by_label.sum(axis=1).replace(0, np.nan), axis=0)
+
+    out = base
+    for l in LABELS:
+        out[f"pct_schools_{l}"] = (100 * schools_by_label.get(l, 0.0)).round(1)
+        out[f"pct_students_{l}"] = (100 * students_by_label.get(l, 0.0)).round(1)
+    return out.reset_index()
+
+# ----------------------------
+# MAIN
+# ----------------------------
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    feats = build_school_features(pd.read_csv(IN_PATH_SCHOOL))
+    t_feat = time.perf_counter() - t0
+
+    # fit (or reuse) on cells with enough students, then place every cell
+    reliable = feats["n_students"].fillna(0) >= MIN_STUDENTS
+    model = cs.load_or_fit_model(feats[reliable], MODEL_PATH, REFIT)
+    feats["cluster_label"] = cs.assign_clusters(model, feats)
+    feats["small_cohort"] = ~reliable
+
+    order_map = {"High": 0, "Low": 1, "Medium": 2}
+    cols = ["region_canonical","school_id","grade","cluster_label","n_students","small_cohort",
+            "performance_percentile_global","performance_percentile_within_grade","percentile_within_region",
+            "composite_overall","mean_z_avg","mean_z_ok","mean_z_size","subjects_covered","entries"]
+    cols += sorted(c for c in feats.columns if c.startswith("strength_"))
+    out = (feats.assign(__order=feats["cluster_label"].map(order_map))
+                .sort_values(["grade","__order","region_canonical","school_id"])[cols]
+                .reset_index(drop=True))
+    out.to_csv(OUT_SCHOOLS, index=False)
+
+    rollup = region_rollup(out)
+    rollup.to_csv(OUT_ROLLUP, index=False)
+
+    print(f"{len(out)} school × grade rows ({out['school_id'].nunique()} schools): "
+          f"features {t_feat:.2f}s, total {time.perf_counter() - t0:.2f}s")
+    print(out["cluster_label"].value_counts().to_string())
+    print(f"Saved {OUT_SCHOOLS.resolve()} and {OUT_ROLLUP.resolve()}")
@@ -0,0 +1,130 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from sklearn.cluster import MiniBatchKMeans
+
+# ----------------------------
+# CONFIG (edit paths if needed)
+# ----------------------------
+IN_DIR        = Path("student_domains")                   # REQUIRED: per-sheet files from data_processing
+OUT_ASSIGN    = Path("student_clusters.parquet")
+OUT_CENTROIDS = Path("student_cluster_centroids.csv")
+
+RANDOM_STATE = 42
+N_CLUSTERS   = 4
+BATCH_ROWS   = 65_536   # rows held in memory at once, whatever the cohort size
+N_EPOCHS     = 2        # streaming passes over each cohort for partial_fit
+
+ID_COLS = ["student_id","school_id","region","gender","grade","subject","modality"]
+
+ASSIGN_SCHEMA = pa.schema([
+    ("student_id", pa.string()), ("school_id", pa.string()), ("region", pa.string()),
+    ("grade", pa.int64()), ("subject", pa.string()), ("modality", pa.string()),
+    ("cluster", pa.int32()), ("cluster_label", pa.string()),
+])
+
+# ----------------------------
+# HELPERS
+# ----------------------------
+def iter_batches(path: Path, columns=None):
+    """Stream a Parquet file as DataFrames of at most BATCH_ROWS rows."""
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS, columns=columns):
+        yield batch.to_pandas()
+
+def domain_matrix(df: pd.DataFrame, domains: list) -> np.ndarray:
+    # domain_pct is 0–100; missing items count as 0 like in the domain pipeline
+    return df[domains].fillna(0.0).to_numpy(dtype=np.float64) / 100.0
+
+def name_clusters(centers: np.ndarray, mean: np.ndarray, domains: list) -> list:
+    """
+    Describe each centroid relative to the cohort mean: overall level (±5 points)
+    plus its relatively weakest domain, e.g. 'Below average, weakest in Writing'.
+    """
+    names = []
+    for c in centers:
+        diff = 100 * (c - mean)
+        level = ("Above average" if diff.mean() > 5 else
+                 "Below average" if diff.mean() < -5 else "Average")
+        name = level
+        if len(domains) > 1:
+            name += f", weakest in {domains[int(np.argmin(diff - diff.mean()))]}"
+        while name in names:
+            name += " (alt)"
+        names.append(name)
+    return names
+
+def cluster_cohort(path: Path, writer: pq.ParquetWriter) -> pd.DataFrame:
+    """Fit MiniBatchKMeans on one cohort by streaming batches, then stream assignments to `writer`."""
+    schema_names = pq.ParquetFile(path).schema_arrow.names
+    domains = [c for c in schema_names if c not in ID_COLS]
+    if not domains:
+        return pd.DataFrame()
+
+    km = MiniBatchKMeans(n_clusters=N_CLUSTERS, random_state=RANDOM_STATE,
+                         batch_size=min(BATCH_ROWS, 4096), n_init=3)
+    total, n = np.zeros(len(domains)), 0
+    pending = []   # first partial_fit needs >= N_CLUSTERS rows
+    for epoch in range(N_EPOCHS):
+        for df in iter_batches(path, columns=domains):
+            X = domain_matrix(df, domains)
+            if epoch == 0:
+                total += X.sum(axis=0); n += len(X)
+            if not hasattr(km, "cluster_centers_"):
+                pending.append(X)
+                X = np.vstack(pending)
+                if len(X) < N_CLUSTERS:
+                    continue
+                pending = []
+            km.partial_fit(X)
+    if not hasattr(km, "cluster_centers_"):
+        return pd.DataFrame()   # fewer students than clusters
+
+    mean = total / max(n, 1)
+    labels = name_clusters(km.cluster_centers_, mean, domains)
+    counts = np.zeros(N_CLUSTERS, dtype=np.int64)
+    first = None
+    for df in iter_batches(path):
+        cid = km.predict(domain_matrix(df, domains)).astype(np.int32)
+        counts += np.bincount(cid, minlength=N_CLUSTERS)
+        out = df[[c for c in ASSIGN_SCHEMA.names if c in df.columns]].copy()
+        out["cluster"] = cid
+        out["cluster_label"] = np.asarray(labels, dtype=object)[cid]
+        for c in ["student_id","school_id","region","subject","modality","cluster_label"]:
+            out[c] = out[c].astype("string")
+        writer.write_table(pa.Table.from_pandas(out, schema=ASSIGN_SCHEMA, preserve_index=False))
+        if first is None:
+            first = df.iloc[0]
+
+    rows = []
+    for k, (center, label) in enumerate(zip(km.cluster_centers_, labels)):
+        for d, v, m in zip(domains, center, mean):
+            rows.append({
+                "grade": first["grade"], "subject": first["subject"], "modality": first["modality"],
+                "cluster": k, "cluster_label": label, "n_students": int(counts[k]),
+                "domain": d, "centroid_pct": round(100 * v, 2), "cohort_mean_pct": round(100 * m, 2),
+            })
+    return pd.DataFrame(rows)
+
+# ----------------------------
+# MAIN
+# ----------------------------
+if __name__ == "__main__":
+    files = sorted(IN_DIR.glob("*.parquet"))
+    if not files:
+        raise SystemExit(f"No per-student domain files in {IN_DIR.resolve()} (run data_processing first)")
+
+    centroids = []
+    # one output file for all cohorts, written batch by batch (sorted by cohort file)
+    with pq.ParquetWriter(OUT_ASSIGN, ASSIGN_SCHEMA) as writer:
+        for path in files:
+            cent = cluster_cohort(path, writer)
+            if not cent.empty:
+                centroids.append(cent)
+                print(f"[{path.stem}] clusters: " +
+                      ", ".join(f"{l} ({n})" for l, n in cent.drop_duplicates("cluster")[["cluster_label","n_students"]].itertuples(index=False)))
+
+    if centroids:
+        pd.concat(centroids, ignore_index=True).to_csv(OUT_CENTROIDS, index=False, encoding="utf-8-sig")
+    print(f"Saved {OUT_ASSIGN.resolve()} and {OUT_CENTROIDS.resolve()}")
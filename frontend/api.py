@@ -0,0 +1,196 @@
+# api.py
+# Read-only JSON API over the same data layer as the dashboard (utils/data.py, utils/query.py),
+# for other tools that need the cohort and risk numbers. Standard library HTTP server, one
+# thread per connection; responses are memoised in the shared slice memo, carry an ETag
+# derived from the version of the files they were built from (304 on If-None-Match), and
+# are gzipped when the client accepts it.
+#
+#   python api.py [--port 8503]      # standalone
+#   python serve.py                  # runs it inside the dashboard process (DASHBOARD_API_PORT)
+#
+#   GET /api/health
+#   GET /api/aggregates?grade=3&subject=Arabic[&region=..][&domain=..]   learning gaps
+#   GET /api/gender?grade=&subject=[&region=][&domain=]                  gender gaps
+#   GET /api/overlap?grade=&subject=[&region=][&domain=]                 priority cohorts
+#   GET /api/cohort-risk?[grade=][&subject=][&region=]                   risk by region
+#   GET /api/students?grade=&subject=[&region=][&school=][&limit=50][&offset=0]
+#       students by descending risk, paginated (limit <= 1000)
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from utils import data, query   # noqa: E402
+
+API_PORT = int(os.environ.get("DASHBOARD_API_PORT", "8503"))   # 0 = serve.py does not start it
+MAX_LIMIT = 1000
+GZIP_MIN_BYTES = 1024
+STUDENT_COLUMNS = ["student_id", "school_id", "region", "grade", "subject", "modality",
+                   "risk_prob_below", "risk_pct"]
+
+# endpoint -> (dataset, dataset when ?domain= is given, accepted filters)
+TABLES = {
+    "/api/aggregates": ("agg_region_grade_subject", "agg_region_grade_subject_domain",
+                        ("grade", "subject", "region", "domain")),
+    "/api/gender": ("agg_gender", "agg_gender_domain", ("grade", "subject", "region", "domain")),
+    "/api/overlap": ("overlap", "overlap_domain", ("grade", "subject", "region", "domain")),
+    "/api/cohort-risk": ("risk_by_region_grade_subject", None, ("grade", "subject", "region")),
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _params(qs: str, allowed) -> dict:
+    raw = {k: v[-1] for k, v in parse_qs(qs).items()}
+    unknown = set(raw) - set(allowed)
+    if unknown:
+        raise BadRequest(f"unknown parameter(s): {sorted(unknown)}")
+    out = {}
+    for k, v in raw.items():
+        if k in ("grade", "limit", "offset"):
+            try:
+                out[k] = int(v)
+            except ValueError:
+                raise BadRequest(f"{k} must be an integer") from None
+        else:
+            out[k] = v
+    return out
+
+
+def _version(names) -> str:
+    """Version token of the files behind a response (snapshot + each file's signature)."""
+    sigs = [data.data_version()] + [repr(data._signature(data.dataset_path(n))) for n in names]
+    return hashlib.sha1("|".join(sigs).encode()).hexdigest()[:16]
+
+
+def _frame_body(df, **extra) -> bytes:
+    head = json.dumps({"data_version": data.data_version(), "count": len(df), **extra}, ensure_ascii=False)
+    return (head[:-1] + ', "rows": ' + df.to_json(orient="records", force_ascii=False) + "}").encode("utf-8")
+
+
+def table_endpoint(path: str, params: dict):
+    name, domain_name, _ = TABLES[path]
+    if "domain" in params:
+        name = domain_name
+    return [name], lambda: _frame_body(data.slice_dataset(name, **params))
+
+
+def students_endpoint(params: dict):
+    if "grade" not in params or "subject" not in params:
+        raise BadRequest("grade and subject are required")
+    limit, offset = params.pop("limit", 50), params.pop("offset", 0)
+    if not 0 < limit <= MAX_LIMIT or offset < 0:
+        raise BadRequest(f"limit must be 1..{MAX_LIMIT} and offset >= 0")
+    cohort = dict(grade=params["grade"], subject=params["subject"],
+                  region=params.get("region"), school=params.get("school"))
+
+    def body():
+        cols = [c for c in STUDENT_COLUMNS if c in query.available_columns()]
+        # same paths as the Students page: presorted store when the index covers the cohort
+        if data.has_risk_index() and not (cohort["school"] and cohort["region"] is None):
+            total = data.cohort_size(**cohort)
+            rows = data.top_risks(**cohort, k=limit, offset=offset, columns=cols)
+        else:
+            total = query.count_students(**cohort)
+            rows = query.student_page(cols, limit=limit, offset=offset, **cohort)
+        return _frame_body(rows, total=total, limit=limit, offset=offset)
+    return ["student_risk_scores", "student_risk_store"], body
+
+
+def health_endpoint(params: dict):
+    return [], lambda: json.dumps({"status": "ok", "data_version": data.data_version()}).encode()
+
+
+def resolve(path: str, qs: str):
+    """(names of the datasets behind the response, zero-arg body builder) for a request."""
+    if path in TABLES:
+        return table_endpoint(path, _params(qs, TABLES[path][2]))
+    if path == "/api/students":
+        return students_endpoint(_params(qs, ("grade", "subject", "region", "school", "limit", "offset")))
+    if path == "/api/health":
+        return health_endpoint(_params(qs, ()))
+    return None
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive: clients reuse one connection
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    server_version = "dashboard-api"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        try:
+            found = resolve(path, url.query)
+            if found is None:
+                return self._send(404, b'{"error": "not found"}')
+            names, build = found
+            etag = f'"{_version(names)}-{hashlib.sha1(self.path.encode()).hexdigest()[:10]}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, b"", etag=etag)
+            body, zipped = data.memoize_slice(("api", etag), lambda: _encode(build()))
+        except BadRequest as exc:
+            return self._send(400, json.dumps({"error": str(exc)}).encode())
+        except Exception as exc:   # keep serving; report without a traceback to the client
+            self.log_error("%s -> %r", self.path, exc)
+            return self._send(500, b'{"error": "internal error"}')
+        if zipped is not None and "gzip" in self.headers.get("Accept-Encoding", ""):
+            return self._send(200, zipped, etag=etag, gzip_=True)
+        self._send(200, body, etag=etag)
+
+    def _send(self, code, body: bytes, etag=None, gzip_=False):
+        self.send_response(code)
+        if code != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "public, max-age=60")
+            self.send_header("Vary", "Accept-Encoding")
+        if gzip_:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):   # per-request logging costs more than the cached response
+        pass
+
+
+def _encode(body: bytes):
+    """(plain, gzipped or None) — compressed once, when the response is first built."""
+    return body, (gzip.compress(body, compresslevel=5) if len(body) >= GZIP_MIN_BYTES else None)
+
+
+def make_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start(port: int = API_PORT) -> None:
+    """Serve the API from a daemon thread of the current process (used by serve.py)."""
+    server = make_server(port)
+    threading.Thread(target=server.serve_forever, name="dashboard-api", daemon=True).start()
+    print(f"[api] listening on :{port}", flush=True)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Read-only JSON API over the dashboard data")
+    ap.add_argument("--port", type=int, default=API_PORT or 8503)
+    ap.add_argument("--host", default="0.0.0.0")
+    args = ap.parse_args()
+    from utils import snapshots, warmup
+    snapshots.start_watcher()   # standalone: nobody else publishes dropped-in bundles
+    warmup.start()
+    print(f"Serving on http://{args.host}:{args.port}/api/", flush=True)
+    make_server(args.port, args.host).serve_forever()
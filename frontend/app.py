@@ -1,5 +1,7 @@
+from utils import snapshots, warmup
+warmup.render_started("Home")   # render latency, reported by utils/warmup.py
+
 import streamlit as st
-from utils.data import load_region_subject
 
 
 st.set_page_config(
@@ -12,9 +14,16 @@ layout="wide",
 st.title("Equity & Learning Gaps Dashboard")
 
 
-# Load data once and put in session
-if "agg_df" not in st.session_state:
-    st.session_state["agg_df"] = load_region_subject()
+# Datasets are loaded once per server process by the background prewarm (utils/warmup.py),
+# shared by every session; started here too (with the data inbox watcher) in case the app was
+# launched without serve.py. Both are no-ops once running.
+snapshots.start_watcher()
+warmup.start()
+state = warmup.status()
+if state["status"] != "ready":
+    st.caption("Loading data in the background — the first page may take a moment.")
 
 
 st.write("Navigate pages: Overview, Learning Gaps, Equity, Overlap, Cluster.")
+
+warmup.render_done()
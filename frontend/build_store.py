@@ -0,0 +1,135 @@
+# frontend/build_store.py
+# Build the columnar student-risk store the pages read (data_proc/student_risk_scores.parquet)
+# from student_risk_scores.csv. The Dockerfile runs it once at image build time; locally:
+#
+#   python build_store.py
+#
+# Dimensions are dictionary-encoded, risk_prob_below is float32 (risk_pct, shown to users, stays
+# float64 so 4.0 never reads 3.9999998), and rows are written in one row group
+# per grade × subject, so a page filtered to one cohort only decodes that part of the file.
+#
+# Rows are sorted by (grade, subject, region, school_id, risk desc, student_id), so every
+# cohort is a contiguous block. student_risk_index.parquet records each block's [start, stop)
+# at three levels (grade × subject, + region, + school), and the ord_gs / ord_gsr columns hold,
+# inside each grade × subject / region block, the row ids in descending-risk order. A top-k
+# or page of any cohort is then an index lookup plus a k-row slice, with no filter or sort.
+#
+# The same table is also written as an uncompressed Arrow IPC file (student_risk_scores.arrow).
+# The app memory-maps it once per process and every session reads those pages directly:
+# no per-session copy, and the OS page cache holds the bytes only once. Type cleanup and
+# derived columns (risk_pct) happen here, so pages never modify what they load.
+#
+# The other per-student artifacts (ARROW_COPIES) get the same treatment: an Arrow IPC copy,
+# sorted by the columns pages filter on. Published files are immutable: they are written to a
+# temp name and renamed into place, never modified, so any number of dashboard replicas on
+# one host can map them and share a single copy in the OS page cache (see serve.py --replicas).
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DATA_DIR = Path(__file__).resolve().parent / "data_proc"
+SRC = DATA_DIR / "student_risk_scores.csv"
+DST = DATA_DIR / "student_risk_scores.parquet"
+DST_INDEX = DATA_DIR / "student_risk_index.parquet"
+DST_ARROW = DATA_DIR / "student_risk_scores.arrow"
+
+# (source in data_proc, Arrow IPC copy, sort keys)
+ARROW_COPIES = [
+    ("student_risk_drivers.parquet", "student_risk_drivers.arrow", ["grade", "subject", "student_id"]),
+    ("student_clusters.parquet", "student_clusters.arrow", ["grade", "region", "school_id", "student_id"]),
+]
+
+LEVELS = [["grade", "subject"], ["grade", "subject", "region"], ["grade", "subject", "region", "school_id"]]
+
+DIMENSIONS = ["school_id", "region", "subject", "modality", "sheet", "file"]
+DTYPES = {"student_id": "string", "risk_prob_below": "float32", "is_below": "int8",
+          **{c: "category" for c in DIMENSIONS}}
+
+
+def risk_order(df: pd.DataFrame, keys: list) -> np.ndarray:
+    """Row ids sorted by block of `keys`, then risk desc, then student_id (blocks must be contiguous)."""
+    block = df.groupby(keys, observed=True, sort=False).ngroup().to_numpy()
+    sid = pd.factorize(df["student_id"], sort=True)[0]
+    return np.lexsort((sid, -df["risk_prob_below"].to_numpy(), block)).astype(np.int32)
+
+
+def cohort_index(df: pd.DataFrame) -> pd.DataFrame:
+    """[start, stop) row range of every cohort at each of LEVELS."""
+    pos = pd.Series(np.arange(len(df)), index=df.index)
+    parts = []
+    for keys in LEVELS:
+        span = pos.groupby([df[k] for k in keys], observed=True, sort=False).agg(["min", "max"])
+        parts.append(pd.DataFrame({"start": span["min"], "stop": span["max"] + 1}).reset_index())
+    out = pd.concat(parts, ignore_index=True)
+    for c in ["subject", "region", "school_id"]:
+        out[c] = out[c].astype("string")
+    return out[["grade", "subject", "region", "school_id", "start", "stop"]]
+
+
+def write_arrow(table: pa.Table, dst: Path) -> None:
+    """Uncompressed Arrow IPC file (compression would force a decode copy on read)."""
+    tmp = dst.with_name(dst.name + ".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, dst)
+
+
+def build(src: Path = SRC, dst: Path = DST, dst_index: Path = DST_INDEX, dst_arrow: Path = DST_ARROW) -> pd.DataFrame:
+    df = pd.read_csv(src, encoding="utf-8-sig", dtype=DTYPES)
+    df["grade"] = pd.to_numeric(df["grade"], errors="coerce")
+    df = df.dropna(subset=["grade"]).astype({"grade": "int16"})
+    df = df.sort_values(["grade", "subject", "region", "school_id", "risk_prob_below", "student_id"],
+                        ascending=[True, True, True, True, False, True], kind="stable").reset_index(drop=True)
+    df["ord_gs"] = risk_order(df, LEVELS[0])
+    df["ord_gsr"] = risk_order(df, LEVELS[1])
+    # keep more precision so 0.9996 shows as 99.96, not 100.0
+    df["risk_pct"] = (df["risk_prob_below"].astype("float64") * 100).round(4)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    bounds = df.groupby(["grade", "subject"], observed=True, sort=False).size().cumsum()
+    tmp = dst.with_name(dst.name + ".tmp")
+    with pq.ParquetWriter(tmp, table.schema, compression="zstd") as writer:
+        start = 0
+        for end in bounds:
+            writer.write_table(table.slice(start, end - start))
+            start = end
+    os.replace(tmp, dst)   # pages never see a half-written store
+
+    tmp = dst_index.with_name(dst_index.name + ".tmp")
+    cohort_index(df).to_parquet(tmp, index=False)
+    os.replace(tmp, dst_index)
+
+    write_arrow(table.combine_chunks(), dst_arrow)
+    return df
+
+
+def publish_arrow_copies(data_dir: Path = DATA_DIR) -> list:
+    """Write the Arrow IPC copy of every ARROW_COPIES source present in data_dir."""
+    written = []
+    for src_name, dst_name, keys in ARROW_COPIES:
+        src = data_dir / src_name
+        if not src.exists():
+            continue
+        table = pq.read_table(src)
+        keys = [k for k in keys if k in table.column_names]
+        if keys:
+            table = table.sort_by([(k, "ascending") for k in keys])
+        write_arrow(table.combine_chunks(), data_dir / dst_name)
+        written.append(data_dir / dst_name)
+    return written
+
+
+if __name__ == "__main__":
+    if not SRC.exists():
+        raise SystemExit(f"{SRC} not found (unpack data_proc first)")
+    df = build()
+    meta = pq.ParquetFile(DST).metadata
+    print(f"Saved {DST}: {len(df):,} rows, {meta.num_row_groups} row groups, "
+          f"{DST.stat().st_size / 2**20:.1f} MB (csv {SRC.stat().st_size / 2**20:.1f} MB); "
+          f"memory-mapped copy {DST_ARROW.name} {DST_ARROW.stat().st_size / 2**20:.1f} MB")
+    for path in publish_arrow_copies():
+        print(f"Saved {path} ({path.stat().st_size / 2**20:.1f} MB)")
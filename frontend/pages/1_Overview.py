@@ -1,8 +1,12 @@
+from utils.warmup import render_done, render_started
+render_started("Overview")   # render latency, reported by utils/warmup.py
+
 import streamlit as st
 import pandas as pd
 import altair as alt
 
-from utils.data import load_region_subject, available_subjects, available_grades
+from utils.data import slice_dataset, dataset_options
+from utils.exports import export_button
 # Mapping Arabic → English for regions
 region_map = {
     "بيروت": "Beirut",
@@ -17,22 +21,17 @@ region_map = {
 
 st.set_page_config(layout="wide")
 
-# Load subject-level data
-df = load_region_subject()
-
-# Filters
-subject = st.selectbox("Subject", available_subjects(df))
-grade = st.selectbox("Grade", available_grades(df))
+# Filters (option lists and slices come from the shared slice memo)
+subject = st.selectbox("Subject", dataset_options("agg_region_grade_subject", "subject"))
+grade = st.selectbox("Grade", dataset_options("agg_region_grade_subject", "grade"))
 
 # Load domain-level data if subject supports it
 if subject in ["Arabic", "English", "French"]:
-    domain_data = pd.read_csv("data_proc/agg_region_grade_subject_domain.csv")
-    domain_df = domain_data[(domain_data.subject == subject) & (domain_data.grade == grade)]
-    domains = sorted(domain_df["domain"].unique())
+    domains = dataset_options("agg_region_grade_subject_domain", "domain", subject=subject, grade=grade)
     selected_domain = st.selectbox("Domain", domains)
-    cur = domain_df[domain_df.domain == selected_domain]
+    cur = slice_dataset("agg_region_grade_subject_domain", subject=subject, grade=grade, domain=selected_domain)
 else:
-    cur = df[(df.subject == subject) & (df.grade == grade)]
+    cur = slice_dataset("agg_region_grade_subject", subject=subject, grade=grade)
 
 # Snapshot metrics
 c1, c2, c3 = st.columns(3)
@@ -69,10 +68,8 @@ st.dataframe(
     )
 )
 
-# ✅ Download snapshot
-st.download_button(
-    "Download snapshot (CSV)",
-    data=cur.to_csv(index=False).encode('utf-8'),
-    file_name=f"snapshot_{subject}_G{grade}.csv",
-    mime="text/csv"
-)
+# ✅ Download snapshot (file built on request)
+export_button("Download snapshot", lambda: cur, f"snapshot_{subject}_G{grade}", key="overview_snapshot",
+              cache_key=(subject, grade, selected_domain if subject in ["Arabic", "English", "French"] else None))
+
+render_done()
@@ -1,7 +1,11 @@
+from utils.warmup import render_done, render_started
+render_started("Learning Gaps")   # render latency, reported by utils/warmup.py
+
 import streamlit as st
 import pandas as pd
 import altair as alt
-from utils.data import load_region_subject, available_subjects, available_grades
+from utils.data import slice_dataset, dataset_options
+from utils.exports import export_button
 # Mapping Arabic → English for regions
 region_map = {
     "بيروت": "Beirut",
@@ -16,23 +20,17 @@ region_map = {
 
 st.set_page_config(layout="wide")
 
-# Load subject-level data
-df = load_region_subject()
-
-# Filters
-subject = st.selectbox("Subject", available_subjects(df))
-grade = st.selectbox("Grade", available_grades(df))
+# Filters (option lists and slices come from the shared slice memo)
+subject = st.selectbox("Subject", dataset_options("agg_region_grade_subject", "subject"))
+grade = st.selectbox("Grade", dataset_options("agg_region_grade_subject", "grade"))
 
 # Load domain-level data if subject supports it
-domain_df = None
 if subject in ["Arabic", "English", "French"]:
-    domain_data = pd.read_csv("data_proc/agg_region_grade_subject_domain.csv")
-    domain_df = domain_data[(domain_data.subject == subject) & (domain_data.grade == grade)]
-    domains = sorted(domain_df["domain"].unique())
+    domains = dataset_options("agg_region_grade_subject_domain", "domain", subject=subject, grade=grade)
     selected_domain = st.selectbox("Domain", domains)
-    cur = domain_df[domain_df.domain == selected_domain]
+    cur = slice_dataset("agg_region_grade_subject_domain", subject=subject, grade=grade, domain=selected_domain)
 else:
-    cur = df[(df.subject == subject) & (df.grade == grade)]
+    cur = slice_dataset("agg_region_grade_subject", subject=subject, grade=grade)
 
 st.subheader("Learning Gaps — % Below Proficiency")
 
@@ -75,10 +73,8 @@ with right:
         )
     )
 
-# Download
-st.download_button(
-    "Download learning gaps (CSV)",
-    data=cur.to_csv(index=False).encode("utf-8"),
-    file_name=f"learning_gaps_{subject}_G{grade}.csv",
-    mime="text/csv",
-)
+# Download (file built on request)
+export_button("Download learning gaps", lambda: cur, f"learning_gaps_{subject}_G{grade}", key="learning_gaps",
+              cache_key=(subject, grade, selected_domain if subject in ["Arabic", "English", "French"] else None))
+
+render_done()
@@ -1,7 +1,11 @@
+from utils.warmup import render_done, render_started
+render_started("Equity")   # render latency, reported by utils/warmup.py
+
 import streamlit as st
 import pandas as pd
 import altair as alt
-from utils.data import load_gender, available_subjects, available_grades
+from utils.data import slice_dataset, dataset_options
+from utils.exports import export_button
 
 st.set_page_config(layout="wide")
 # Mapping Arabic → English for regions
@@ -16,30 +20,23 @@ region_map = {
     "بعلبك والهرمل": "Baalbek-Hermel",
 }
 
-# Load subject-level gender equity data
-df = load_gender()
-
-# Filters
-subject = st.selectbox("Subject", available_subjects(df))
-grade = st.selectbox("Grade", available_grades(df))
+# Filters (subject-level gender equity data; slices come from the shared slice memo)
+subject = st.selectbox("Subject", dataset_options("agg_gender", "subject"))
+grade = st.selectbox("Grade", dataset_options("agg_gender", "grade"))
 dim = st.selectbox("Equity dimension", ["Gender"], index=0)
 
 # If subject has domains, use domain-level file
 if subject in ["Arabic", "English", "French"]:
-    domain_data = pd.read_csv("data_proc/agg_gender_domain.csv")
-    domain_df = domain_data[
-        (domain_data.subject == subject) & (domain_data.grade == grade)
-    ]
-    domains = sorted(domain_df["domain"].unique())
+    domains = dataset_options("agg_gender_domain", "domain", subject=subject, grade=grade)
     selected_domain = st.selectbox("Domain", domains)
-    cur = domain_df[domain_df.domain == selected_domain]
+    cur = slice_dataset("agg_gender_domain", subject=subject, grade=grade, domain=selected_domain)
 else:
-    cur = df[(df.subject == subject) & (df.grade == grade)]
+    cur = slice_dataset("agg_gender", subject=subject, grade=grade)
 
 st.subheader("Equity Analysis")
 
 if not cur.empty:
-    cur.columns = [c.strip().lower() for c in cur.columns]  # normalize
+    cur = cur.rename(columns=lambda c: c.strip().lower())  # normalize (slices are shared, don't modify)
 
     if "pct_a" in cur.columns and "pct_b" in cur.columns:
         # ✅ Build Male vs Female bar chart
@@ -111,9 +108,8 @@ st.dataframe(
     ]
 )
 
-# ✅ Download button
-st.download_button(
-    "Download CSV",
-    cur_table.to_csv(index=False).encode("utf-8"),
-    file_name=f"equity_{subject}_G{grade}.csv",
-)
+# ✅ Download button (file built on request)
+export_button("Download table", lambda: cur_table, f"equity_{subject}_G{grade}", key="equity_table",
+              cache_key=(subject, grade, selected_domain if subject in ["Arabic", "English", "French"] else None))
+
+render_done()
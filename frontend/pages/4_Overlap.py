@@ -1,6 +1,10 @@
+from utils.warmup import render_done, render_started
+render_started("Overlap")   # render latency, reported by utils/warmup.py
+
 import streamlit as st
 import pandas as pd
-from utils.data import load_overlap, available_subjects
+from utils.data import slice_dataset, dataset_options
+from utils.exports import export_button
 
 st.set_page_config(layout="wide")
 # Mapping Arabic → English for regions
@@ -15,37 +19,26 @@ region_map = {
     "بعلبك والهرمل": "Baalbek-Hermel",
 }
 
-# Load overlap dataset
-df = load_overlap()
-
 # Subject dropdown (from available subjects in data)
-subject = st.selectbox("Subject", available_subjects(df))
+subject = st.selectbox("Subject", dataset_options("overlap", "subject"))
 
 # Grade dropdown (force always 1–6)
 grade = st.selectbox("Grade", [1, 2, 3, 4, 5, 6])
 
 # If subject has domains, check if domain-level overlap exists
-domain_df = None
 selected_domain = None
 if subject in ["Arabic", "English", "French"]:
-    try:
-        domain_data = pd.read_csv("data_proc/overlap_domain.csv")
-        domain_df = domain_data[
-            (domain_data.subject == subject) & (domain_data.grade == grade)
-        ]
-        if not domain_df.empty:
-            domains = sorted(domain_df["domain"].unique())
-            selected_domain = st.selectbox("Domain", domains)
-            cur = domain_df[domain_df.domain == selected_domain]
-        else:
-            st.warning(f"No domain-level data found for {subject}, Grade {grade}.")
-            cur = pd.DataFrame()
-    except FileNotFoundError:
-        st.warning("⚠️ overlap_domain.csv not found.")
+    # empty if overlap_domain.csv was not produced
+    domains = dataset_options("overlap_domain", "domain", subject=subject, grade=grade)
+    if domains:
+        selected_domain = st.selectbox("Domain", domains)
+        cur = slice_dataset("overlap_domain", subject=subject, grade=grade, domain=selected_domain)
+    else:
+        st.warning(f"No domain-level data found for {subject}, Grade {grade}.")
         cur = pd.DataFrame()
 else:
     # Fallback to subject-level overlap
-    cur = df[(df.subject == subject) & (df.grade == grade)]
+    cur = slice_dataset("overlap", subject=subject, grade=grade)
 
 # Main section
 st.subheader(f"Overlap — Where learning gaps meet equity gaps (Priority cohorts)")
@@ -86,9 +79,8 @@ else:
             )
             st.info(msg)
 
-    # Download button
-    st.download_button(
-        "Download overlaps (CSV)",
-        cur.to_csv(index=False).encode("utf-8"),
-        file_name=f"overlaps_{subject}_G{grade}.csv",
-    )
+    # Download button (file built on request)
+    export_button("Download overlaps", lambda: cur, f"overlaps_{subject}_G{grade}", key="overlaps",
+                  cache_key=(subject, grade, selected_domain))
+
+render_done()
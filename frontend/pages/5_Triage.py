@@ -1,26 +1,31 @@
 # frontend/pages/5_Triage.py
+from utils.warmup import render_done, render_started
+render_started("Triage")   # render latency, reported by utils/warmup.py
+
 import pandas as pd
 import streamlit as st
 
 from utils.data import (
-    load_risk_cohort, load_student_risks, load_risk_coeffs, load_risk_metrics
+    load_student_risks, load_risk_metrics, has_risk_index, top_risks,
+    slice_dataset, dataset_options, slice_risk_hist,
 )
-from utils.charts import bar_horizontal
-from utils.stats import kpi_row, aggregate_domain_importance
+from utils.charts import bar_horizontal, calibration_chart, risk_box_chart, risk_histogram_chart
+from utils.exports import export_button
+from utils.query import calibration_curve, risk_box_stats, risk_distribution
+from utils.stats import kpi_row, aggregate_domain_importance, format_drivers, share_at_or_above
 
 st.set_page_config(page_title="Triage", page_icon="🧭", layout="wide")
 st.title("Student Triage")
 
-# ---------- Load model outputs ----------
-cohort  = load_risk_cohort()        # data_proc/risk_by_region_grade_subject.csv
-risks   = load_student_risks()      # data_proc/student_risk_scores.csv
-coefs   = load_risk_coeffs()        # data_proc/risk_model_coefficients.csv
+# ---------- Model outputs (sliced through the shared memo in utils/data.py) ----------
+# risk_by_region_grade_subject.csv, risk_model_coefficients.csv,
+# student_risk_drivers.parquet (optional), risk_hist_by_region_grade_subject.csv
 metrics = load_risk_metrics()       # data_proc/risk_model_metrics.json (not used directly here)
 
 # ---------- Filters (only values that exist in risk files) ----------
-grades   = sorted(cohort["grade"].dropna().unique().tolist())
-subjects = sorted(cohort["subject"].dropna().unique().tolist())
-regions  = ["All"] + sorted(cohort["region"].dropna().unique().tolist())
+grades   = dataset_options("risk_by_region_grade_subject", "grade")
+subjects = dataset_options("risk_by_region_grade_subject", "subject")
+regions  = ["All"] + dataset_options("risk_by_region_grade_subject", "region")
 
 with st.sidebar:
     st.header("Filters")
@@ -28,22 +33,29 @@ with st.sidebar:
     s = st.selectbox("Subject", subjects, index=0)
     r = st.selectbox("Region", regions, index=0)
     thr = st.slider("High-risk threshold", 0.50, 0.95, 0.85, 0.01)
+thr_pct = round(thr * 100)   # same rounding as share_at_or_above's bin edge, so labels match the counts
 
 # ---------- Slice data ----------
-cohort_gs = cohort.query("grade == @g and subject == @s").copy()
-if r != "All":
-    cohort_gs = cohort_gs.query("region == @r")
+cohort_gs = slice_dataset("risk_by_region_grade_subject", grade=g, subject=s,
+                          region=None if r == "All" else r).copy()
+
+# share at/above the slider threshold, from the per-cohort risk histogram
+hist_gs = slice_risk_hist(g, s, region=None if r == "All" else r)
+above   = share_at_or_above(hist_gs, thr)
+pct_above = cohort_gs["region"].map(above.set_index("region")["pct_above"])
+cohort_gs = cohort_gs.drop(columns=["pct_students_above80"], errors="ignore")
+cohort_gs.insert(cohort_gs.columns.get_loc("n_students"), "pct_above", pct_above)
 
 # KPIs
 n_regions    = cohort_gs["region"].nunique()
 avg_risk_val = cohort_gs["avg_risk"].mean() if len(cohort_gs) else 0.0
-p_thr        = cohort_gs["pct_students_above80"].mean() if "pct_students_above80" in cohort_gs else float("nan")
+p_thr        = 100 * above["n_above"].sum() / above["n"].sum() if above["n"].sum() else float("nan")
 n_students   = int(cohort_gs["n_students"].sum()) if "n_students" in cohort_gs else 0
 
 kpi_row([
     ("Regions shown", str(n_regions), None),
     ("Average risk", f"{avg_risk_val:.1f}%", "Mean probability of being below proficiency"),
-    (f"% students ≥{int(thr*100)}% risk", f"{p_thr:.1f}%", "Share of high-risk students"),
+    (f"% students ≥{thr_pct}% risk", f"{p_thr:.1f}%", "Share of high-risk students"),
     ("Students (total)", f"{n_students:,}", None),
 ])
 
@@ -53,7 +65,7 @@ tbl = cohort_gs.sort_values("avg_risk", ascending=False).reset_index(drop=True)
 styled = (
     tbl.rename(columns={
         "avg_risk": "Average risk (%)",
-        "pct_students_above80": f"% students ≥{int(thr*100)}%",
+        "pct_above": f"% students ≥{thr_pct}%",
         "n_students": "N students"
     })
     .style
@@ -61,25 +73,57 @@ styled = (
 )
 st.dataframe(styled, use_container_width=True)
 
-# Download
-csv = tbl.to_csv(index=False).encode("utf-8-sig")
-st.download_button("Download table (CSV)", csv, file_name=f"triage_grade{g}_{s}.csv", mime="text/csv")
+# Download (serialised only on request)
+export_button("Download table", lambda: tbl, f"triage_grade{g}_{s}", key="triage_regions",
+              cache_key=(g, s, r, thr))
+
+# ---------- Risk distribution (binned in the query engine; charts get bins, not students) ----------
+st.subheader(f"Risk distribution — Grade {g} {s}" + (f" · {r}" if r != "All" else ""))
+dist_filters = dict(grade=g, subject=s, region=None if r == "All" else r)
+c1, c2 = st.columns(2)
+with c1:
+    log = st.checkbox("Log scale", value=True, help="Most students sit near 0% or 100% risk.")
+    st.altair_chart(risk_histogram_chart(risk_distribution(**dist_filters), thr=thr, log=log),
+                    use_container_width=True)
+with c2:
+    by = "region" if r == "All" else "school_id"
+    box = risk_box_stats(by, **dist_filters).head(25)
+    st.caption(f"Risk by {'region' if r == 'All' else 'school (25 highest medians)'} — "
+               "box = middle 50%, tick = median, line = 1.5×IQR")
+    st.altair_chart(risk_box_chart(box, by=by), use_container_width=True)
+
+cal = calibration_curve(**dist_filters)
+if not cal.empty:
+    st.markdown("**Calibration** — predicted risk vs observed share below proficiency")
+    st.altair_chart(calibration_chart(cal), use_container_width=True)
+    gap = 100 * (cal["n"] * (cal["mean_pred"] - cal["frac_below"]).abs()).sum() / cal["n"].sum()
+    st.caption(f"Calibration error (student-weighted mean |predicted − observed|): {gap:.1f} pp. "
+               "Points on the dashed diagonal are perfectly calibrated; point size = students.")
 
 # ---------- Drilldown: top-risk students (if region chosen) ----------
 if r != "All":
     st.subheader(f"Top-risk students — {r} · Grade {g} · {s}")
-    top = (
-        risks.query("region == @r and grade == @g and subject == @s")
-             .sort_values("risk_prob_below", ascending=False)
-             .assign(risk_pct=lambda d: (100 * d["risk_prob_below"]).round(1))
-             [["student_id","school_id","risk_pct"]]
-             .head(150)
-    )
-    st.dataframe(top, use_container_width=True)
+    cols = ["student_id","school_id","grade","subject","modality","risk_prob_below","risk_pct"]
+    if has_risk_index():
+        # 150 riskiest straight from the presorted store (offset lookup + slice)
+        top = top_risks(g, s, region=r, k=150, columns=cols)
+    else:
+        top = (load_student_risks(cols, grade=g, subject=s, region=r)
+               .sort_values("risk_prob_below", ascending=False).head(150))
+    show = ["student_id","school_id","risk_pct"]
+    drivers = slice_dataset("student_risk_drivers", grade=g, subject=s)   # optional file
+    if not drivers.empty:
+        # precomputed in training: per-student domain contributions (coef × centred score)
+        keys = ["student_id","grade","subject","modality"]
+        top = top.merge(drivers, on=keys, how="left")
+        top["top_drivers"] = format_drivers(top)
+        show.append("top_drivers")
+    st.dataframe(top[show], use_container_width=True,
+                 column_config={"risk_pct": st.column_config.NumberColumn(format="%.1f")})
 
 # ---------- Drivers: DOMAIN-LEVEL coefficients ----------
 st.subheader("Strongest drivers (model coefficients, domain-level)")
-coef_slice = coefs.query("grade == @g and subject == @s")[["feature","coef"]].copy()
+coef_slice = slice_dataset("risk_model_coefficients", grade=g, subject=s)[["feature","coef"]].copy()
 
 if coef_slice.empty:
     st.info("No model coefficients available for this cohort (a heuristic risk was used).")
@@ -114,9 +158,11 @@ if len(tbl):
     top_regions = tbl.head(2)["region"].tolist()
     bullet = f"""
 - Prioritise **{', '.join(top_regions)}** for small-group tutoring and weekly progress checks.  
-- Allocate extra teacher support to classes with the highest **% students ≥{int(thr*100)}% risk**.  
+- Allocate extra teacher support to classes with the highest **% students ≥{thr_pct}% risk**.  
 - Use the **Learning Gaps** tab to target weak domains (e.g., *Reading Comprehension*, *Writing*).  
 """
     st.markdown(bullet)
 
 st.caption("Model quality — see `data_proc/risk_model_metrics.json` for AUC/AP and calibration details.")
+
+render_done()
@@ -1,10 +1,13 @@
-import os
-import io
+from utils.warmup import render_done, render_started
+render_started("Cluster")   # render latency, reported by utils/warmup.py
+
 import numpy as np
 import pandas as pd
 import streamlit as st
 import altair as alt
-import plotly.express as px
+from utils.clustering import FEATURE_COLS, recluster
+from utils.data import load_region_clusters, load_student_clusters, load_student_cluster_centroids
+from utils.exports import export_button
 
 # -----------------------------
 # Config
@@ -15,12 +18,6 @@ st.set_page_config(
     layout="wide",
 )
 
-CSV_CANDIDATES = [
-    "region_grade_clusters_hybrid.csv",
-    os.path.join("frontend", "data_proc", "region_grade_clusters_hybrid.csv"),
-    os.path.join("data_proc", "region_grade_clusters_hybrid.csv"),
-]
-
 REQUIRED_COLS = [
     "region_canonical","grade","cluster_label",
     "performance_percentile_global","performance_percentile_within_grade",
@@ -34,12 +31,12 @@ def load_data(uploaded_file=None):
     if uploaded_file is not None:
         df = pd.read_csv(uploaded_file)
     else:
-        path = next((p for p in CSV_CANDIDATES if os.path.exists(p)), None)
-        if path is None:
+        df = load_region_clusters()   # data_proc/region_grade_clusters_hybrid.csv (shared, read-only)
+        if df.empty:
             st.warning("Upload a CSV in the sidebar or place "
-                       "region_grade_clusters_hybrid.csv in the app folder.")
+                       "region_grade_clusters_hybrid.csv in data_proc/.")
             st.stop()
-        df = pd.read_csv(path)
+        df = df.copy()
 
     # Normalize expected columns/casing
     df.columns = [c.strip() for c in df.columns]
@@ -80,21 +77,39 @@ regions = st.sidebar.multiselect(
 )
 search = st.sidebar.text_input("Search region contains…", value="").strip()
 
+st.sidebar.markdown("---")
+recluster_on = st.sidebar.toggle(
+    "Re-cluster current selection", value=False,
+    help="Refit the GMM on the selected grades/regions and features instead of using the precomputed labels."
+)
+if recluster_on:
+    feat_opts = [c for c in FEATURE_COLS if c in df.columns]
+    features = st.sidebar.multiselect("Clustering features", feat_opts, default=feat_opts)
+    k = st.sidebar.slider("Number of clusters (k)", 2, 6, 3)
+
 mask = (
     df["grade"].isin(grades) &
-    df["cluster_label"].isin(clusters) &
     df["region_canonical"].isin(regions)
 )
 if search:
     mask &= df["region_canonical"].str.contains(search, case=False, na=False)
 
 f = df[mask].copy()
+if recluster_on:
+    # fit on the rows left after grade/region/search filters; the label filter applies afterwards
+    cols = list(dict.fromkeys(["composite_overall"] + features))
+    fit = recluster(f[cols], tuple(features), k)
+    f["cluster_label"] = fit["cluster_label"]
+    if (fit["method"] == "percentile").any():
+        st.sidebar.info("Clusters too unbalanced (or too few rows) — fell back to percentile cutoffs.")
+f = f[f["cluster_label"].isin(clusters)]
 
 # -----------------------------
 # Header
 # -----------------------------
 st.title("📊 Region × Grade Clusters (High / Medium / Low)")
-st.caption("Source: region_grade_clusters_hybrid.csv")
+st.caption("Source: region_grade_clusters_hybrid.csv" +
+           (f" — re-clustered on {len(features)} features, k={k}" if recluster_on else ""))
 
 # -----------------------------
 # KPI Row
@@ -155,6 +170,7 @@ st.altair_chart(chart2, use_container_width=True)
 # Chart 3: Composite vs Percentile (scatter)
 # -----------------------------
 st.subheader("Composite vs Global Percentile")
+import plotly.express as px   # only this chart needs plotly; imported here to keep it off the import path
 scatter = px.scatter(
     f, x="composite_overall", y="performance_percentile_global",
     color="cluster_label",
@@ -198,15 +214,72 @@ show_cols = [
     "composite_overall","mean_z_avg","mean_z_ok","mean_z_size",
     "subjects_covered","entries","strength_Arabic","strength_English","strength_French"
 ]
+if "label_confidence" in f.columns:  # present when the pipeline ran with STABILITY = True
+    show_cols.append("label_confidence")
 st.dataframe(
     f[show_cols].sort_values(["grade","cluster_label","region_canonical"]).reset_index(drop=True),
     use_container_width=True
 )
 
-csv_buf = io.StringIO()
-f[show_cols].to_csv(csv_buf, index=False)
-st.download_button("Download filtered CSV", data=csv_buf.getvalue(),
-                   file_name="filtered_clusters.csv", mime="text/csv")
+export_key = (getattr(uploaded, "file_id", None), tuple(grades), tuple(regions), tuple(clusters), search,
+              (tuple(features), k) if recluster_on else None)
+export_button("Download filtered rows", lambda: f[show_cols], "filtered_clusters", key="region_clusters",
+              cache_key=export_key)
+
+# -----------------------------
+# Student clusters (weakness profiles, from clusters_feature_dashboard/student_clusters.py)
+# -----------------------------
+st.subheader("Student Clusters by Domain Weakness Profile")
+centroids = load_student_cluster_centroids()
+if centroids.empty:
+    st.info("Run clusters_feature_dashboard/student_clusters.py and place student_clusters.parquet and "
+            "student_cluster_centroids.csv in data_proc/ to see student-level clusters here.")
+else:
+    c1, c2, c3 = st.columns(3)
+    s_grade = int(c1.selectbox("Grade", sorted(centroids["grade"].astype(int).unique()), key="sc_grade"))
+    students = load_student_clusters(grade=s_grade)
+    s_region = c2.selectbox("Region", ["All"] + sorted(students["region"].dropna().unique()), key="sc_region")
+    s_region = None if s_region == "All" else s_region
+    if s_region is not None:
+        students = load_student_clusters(grade=s_grade, region=s_region)
+    s_school = c3.selectbox("School", ["All"] + sorted(students["school_id"].dropna().unique()), key="sc_school")
+    s_school = None if s_school == "All" else s_school
+    if s_school is not None:
+        students = load_student_clusters(grade=s_grade, region=s_region, school=s_school)
+
+    students = students.assign(cohort=students["subject"].astype(str) + " / " + students["modality"].astype(str))
+    st.metric("Students in view", f"{students['student_id'].nunique():,}")
+
+    mix = students.groupby(["cohort", "cluster_label"], as_index=False).agg(n=("student_id", "size"))
+    mix["share"] = mix["n"] / mix.groupby("cohort")["n"].transform("sum")
+    chart5 = (
+        alt.Chart(mix)
+          .mark_bar()
+          .encode(
+              y=alt.Y("cohort:N", title=None),
+              x=alt.X("share:Q", title="Share of students", axis=alt.Axis(format="%")),
+              color=alt.Color("cluster_label:N", title="Cluster", scale=alt.Scale(scheme="tableau20")),
+              tooltip=["cohort", "cluster_label", alt.Tooltip("n:Q", format=","),
+                       alt.Tooltip("share:Q", format=".1%")],
+          )
+          .properties(height=40 * max(3, mix["cohort"].nunique()))
+    )
+    st.altair_chart(chart5, use_container_width=True)
+
+    # centroids describe the whole grade cohort; the filters above only change who is counted
+    cent_g = centroids[centroids["grade"].astype(int) == s_grade]
+    cent_g = cent_g.assign(cohort=cent_g["subject"].astype(str) + " / " + cent_g["modality"].astype(str))
+    s_cohort = st.selectbox("Centroids for", sorted(cent_g["cohort"].unique()), key="sc_cohort")
+    prof = cent_g[cent_g["cohort"] == s_cohort].pivot_table(
+        index="domain", columns="cluster_label", values="centroid_pct", aggfunc="first")
+    if "cohort_mean_pct" in cent_g.columns:
+        prof["Cohort mean"] = cent_g[cent_g["cohort"] == s_cohort].groupby("domain")["cohort_mean_pct"].first()
+    st.caption("Mean domain score (%) at each cluster centre")
+    st.dataframe(prof.round(1), use_container_width=True)
+
+    export_button("Download student cluster assignments", lambda: students.drop(columns="cohort"),
+                  f"student_clusters_grade{s_grade}", key="student_clusters",
+                  cache_key=(s_grade, s_region, s_school))
 
 # -----------------------------
 # Notes / Help
@@ -217,4 +290,9 @@ with st.expander("ℹ What am I looking at?"):
 - *Composite overall* is the mean of per-subject z-scores of average score and success rate.
 - *Subject strengths* are per-subject z-scores (Arabic/English/French).
 - *Percentiles: global is across all region×grade; *within-grade is relative only to the same grade.
-""")
\ No newline at end of file
+- *Label confidence* (if present) is the share of bootstrap refits that gave the row the same label.
+- *Student clusters* group students of one grade × subject × modality by their domain scores (mini-batch k-means);
+  each cluster is named after its level and relatively weakest domain.
+""")
+
+render_done()
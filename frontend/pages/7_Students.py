@@ -1,7 +1,16 @@
+from utils.warmup import render_done, render_started
+render_started("Students")   # render latency, reported by utils/warmup.py
+
 import math
 import pandas as pd
 import streamlit as st
-from utils.data import load_student_risks
+from utils.data import dataset_options, has_risk_index, cohort_size, top_risks
+from utils.query import (
+    available_columns, count_students, distinct_values, student_batches, student_page,
+    risk_distribution, calibration_curve,
+)
+from utils.charts import calibration_chart, risk_histogram_chart
+from utils.exports import export_button
 
 # Optional: increase Styler limit (can be omitted if using the gate below)
 pd.set_option("styler.render.max_elements", 1_000_000)
@@ -9,68 +18,55 @@ pd.set_option("styler.render.max_elements", 1_000_000)
 st.set_page_config(page_title="Students", page_icon="👩‍🎓", layout="wide")
 st.title("Per-student Risk")
 
-# ---------- Load ----------
-risks = load_student_risks()
-
-# ---------- Clean types ----------
-risks["grade"] = pd.to_numeric(risks["grade"], errors="coerce")
-risks = risks.dropna(subset=["grade"]).copy()
-risks["grade"] = risks["grade"].astype(int)
-
-if "risk_prob_below" in risks.columns:
-    # keep more precision so 0.9996 shows as 99.96, not 100.0
-    risks["risk_pct"] = (risks["risk_prob_below"] * 100).round(4)
-
-
-# ---------- Filters ----------
+# ---------- Filters (options from the small cohort table, memoised in utils/data.py) ----------
+COHORT = "risk_by_region_grade_subject"
 cols = st.columns(5)
 with cols[0]:
-    g = st.selectbox("Grade", sorted(risks["grade"].unique().tolist()))
+    g = st.selectbox("Grade", dataset_options(COHORT, "grade"))
 with cols[1]:
-    s = st.selectbox("Subject", sorted(risks.query("grade == @g")["subject"].dropna().unique().tolist()))
+    s = st.selectbox("Subject", dataset_options(COHORT, "subject", grade=g))
 with cols[2]:
-    r = st.selectbox("Region", ["All"] + sorted(risks.query("grade == @g and subject == @s")["region"].dropna().unique().tolist()))
+    r = st.selectbox("Region", ["All"] + dataset_options(COHORT, "region", grade=g, subject=s))
 with cols[3]:
     thr = st.slider("Highlight ≥", 0.50, 0.99, 0.85, 0.01)
 with cols[4]:
     q = st.text_input("Search student_id…", "")
 
-# ---------- Apply filters ----------
-cur = risks.query("grade == @g and subject == @s").copy()
-if r != "All":
-    cur = cur.query("region == @r")
-if q:
-    cur = cur[cur["student_id"].astype(str).str.contains(q, case=False, na=False)]
+# ---------- Filters pushed into the query engine (utils/query.py) ----------
+filters = {"grade": g, "subject": s, "region": None if r == "All" else r, "search": q or None}
+have = set(available_columns())
 
 # Optional: School/Class filters
 c1, c2 = st.columns(2)
 with c1:
-    schools = ["All"] + sorted(cur["school_id"].dropna().astype(str).unique().tolist())
-    school = st.selectbox("School", schools, index=0)
+    school = st.selectbox("School", ["All"] + distinct_values("school_id", **filters), index=0)
     if school != "All":
-        cur = cur[cur["school_id"].astype(str) == school]
+        filters["school"] = school
 with c2:
-    if "class_name" in cur.columns:
-        classes = ["All"] + sorted(cur["class_name"].dropna().astype(str).unique().tolist())
-        cls = st.selectbox("Class", classes, index=0)
+    if "class_name" in have:
+        cls = st.selectbox("Class", ["All"] + distinct_values("class_name", **filters), index=0)
         if cls != "All":
-            cur = cur[cur["class_name"].astype(str) == cls]
-
-# ---------- Prepare table ----------
-cols_to_show = [c for c in ["student_id","school_id","class_name","region","grade","subject","modality","risk_prob_below","risk_pct"] if c in cur.columns]
-cur = (cur.sort_values("risk_prob_below", ascending=False)[cols_to_show]
-          .reset_index(drop=True))
-
-st.caption(f"{len(cur):,} students")
-
-# ---------- Pagination ----------
+            filters["class_name"] = cls
+
+cols_to_show = [c for c in ["student_id","school_id","class_name","region","grade","subject","modality","risk_prob_below","risk_pct"] if c in have]
+# plain cohort views (no search / class filter) page straight off the presorted store;
+# the index nests school under region, so a school pick with region "All" goes to the engine
+indexed = (has_risk_index() and not q and "class_name" not in filters
+           and not (filters.get("school") and filters["region"] is None))
+cohort_key = dict(grade=g, subject=s, region=filters["region"], school=filters.get("school"))
+total_rows = cohort_size(**cohort_key) if indexed else count_students(**filters)
+st.caption(f"{total_rows:,} students")
+
+# ---------- Pagination (LIMIT/OFFSET in the engine, sorted by risk) ----------
 rows_per_page = st.sidebar.slider("Rows per page", 50, 1000, 200, 50)
-total_rows = len(cur)
 total_pages = max(1, math.ceil(total_rows / rows_per_page))
 page = st.sidebar.number_input("Page", 1, total_pages, 1)
 start = (page - 1) * rows_per_page
 end = start + rows_per_page
-view = cur.iloc[start:end].copy()
+if indexed:
+    view = top_risks(**cohort_key, k=rows_per_page, offset=start, columns=cols_to_show)
+else:
+    view = student_page(cols_to_show, limit=rows_per_page, offset=start, **filters)
 
 st.caption(f"Showing rows {start+1:,}–{min(end,total_rows):,} of {total_rows:,}")
 
@@ -91,16 +87,26 @@ else:
         st.info("Large result set—showing without styling for performance.")
     st.dataframe(view, use_container_width=True)
 
-# ---------- Downloads ----------
-st.download_button(
-    "Download current page (CSV)",
-    view.to_csv(index=False, encoding="utf-8-sig"),
-    file_name="students_page.csv",
-    mime="text/csv",
-)
-st.download_button(
-    "Download current view (filtered, all rows) (CSV)",
-    cur.to_csv(index=False, encoding="utf-8-sig"),
-    file_name=f"students_grade{g}_{s}_{r}.csv",
-    mime="text/csv"
-)
+# ---------- Risk distribution of the whole filtered view (binned in the engine) ----------
+with st.expander("Risk distribution of this view"):
+    c1, c2 = st.columns(2)
+    with c1:
+        st.altair_chart(risk_histogram_chart(risk_distribution(**filters), thr=thr, log=True),
+                        use_container_width=True)
+    with c2:
+        cal = calibration_curve(**filters)
+        if cal.empty:
+            st.info("No observed outcomes (is_below) in the risk scores — calibration unavailable.")
+        else:
+            st.altair_chart(calibration_chart(cal), use_container_width=True)
+
+# ---------- Downloads (built only when requested, see utils/exports.py) ----------
+filter_key = tuple(sorted(filters.items()))
+export_button("Download current page", lambda: view, "students_page", key="students_page",
+              cache_key=(filter_key, tuple(cols_to_show), rows_per_page, start))
+# every matching row, same order as the pages, streamed from the engine in batches
+export_button("Download current view (filtered, all rows)",
+              lambda: student_batches(cols_to_show, **filters),
+              f"students_grade{g}_{s}_{r}", key="students_view", cache_key=(filter_key, tuple(cols_to_show)))
+
+render_done()
@@ -0,0 +1,139 @@
+# serve.py
+# Container entry point: starts the background prewarm and the health endpoint
+# (utils/warmup.py) and the JSON API (api.py) inside the server process, then hands over to
+# `streamlit run app.py`, so data is warm before the first visitor arrives and the API shares
+# the dashboard's caches. Extra arguments go to streamlit.
+#
+#   python serve.py                        # same as `streamlit run app.py`, plus prewarm
+#   curl localhost:8502/healthz            # 503 while warming, 200 + timings when ready
+#   curl localhost:8503/api/cohort-risk    # JSON API (DASHBOARD_API_PORT=0 turns it off)
+#
+# Multi-replica mode (several processes on one host behind a load balancer):
+#
+#   python serve.py --replicas 3           # or DASHBOARD_REPLICAS=3
+#
+# Replica i serves the dashboard on 8510+i, health on 8520+i and the API on 8530+i. All
+# replicas memory-map the same immutable Arrow files (build_store.py), so the per-student data
+# sits once in the OS page cache rather than once per process; only replica 0 watches the
+# data inbox, the others follow the snapshot it publishes. Streamlit keeps each session in
+# one process over a websocket, so the balancer must be sticky (e.g. nginx ip_hash). The
+# supervisor itself answers /healthz on DASHBOARD_HEALTH_PORT (8502): 200 once every replica
+# reports ready, with each replica's status in the body, so the container healthcheck and
+# external probes use one port in both modes.
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+os.environ.setdefault("DASHBOARD_STARTED_AT", repr(time.time()))
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+REPLICA_PORT = 8510
+REPLICA_HEALTH_PORT = 8520
+REPLICA_API_PORT = 8530
+HEALTH_PORT = int(os.environ.get("DASHBOARD_HEALTH_PORT", "8502"))   # supervisor's aggregate /healthz
+MAX_REPLICAS = REPLICA_HEALTH_PORT - REPLICA_PORT                    # port ranges must not overlap
+
+
+def replica_health(port: int) -> tuple:
+    """(HTTP status, JSON body) of one replica's /healthz; 503 if it does not answer."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as exc:   # 503 while the replica is warming
+        return exc.code, json.loads(exc.read() or b"{}")
+    except (OSError, ValueError) as exc:
+        return 503, {"status": "down", "error": str(exc)}
+
+
+def serve_aggregate_health(n: int) -> None:
+    """/healthz over all n replicas on HEALTH_PORT: 200 only when every replica is ready."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("/healthz", ""):
+                self.send_error(404)
+                return
+            checks = [replica_health(REPLICA_HEALTH_PORT + i) for i in range(n)]
+            ok = all(code == 200 for code, _ in checks)
+            body = json.dumps({"status": "ready" if ok else "warming",
+                               "replicas": [dict(body, port=REPLICA_HEALTH_PORT + i)
+                                            for i, (_, body) in enumerate(checks)]}).encode("utf-8")
+            self.send_response(200 if ok else 503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):   # keep probes out of the server log
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", HEALTH_PORT), Handler)
+    except OSError as exc:
+        print(f"[serve] aggregate health endpoint disabled: {exc}", file=sys.stderr, flush=True)
+        return
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="dashboard-health", daemon=True).start()
+
+
+def run_replicas(n: int, args: list) -> int:
+    """Supervise n single-process servers; stop them all when one exits or on SIGTERM."""
+    if n > MAX_REPLICAS:
+        raise SystemExit(f"at most {MAX_REPLICAS} replicas (ports {REPLICA_PORT}+i, {REPLICA_HEALTH_PORT}+i, "
+                         f"{REPLICA_API_PORT}+i)")
+    procs = []
+    for i in range(n):
+        env = dict(os.environ,
+                   DASHBOARD_REPLICAS="1",
+                   DASHBOARD_HEALTH_PORT=str(REPLICA_HEALTH_PORT + i),
+                   DASHBOARD_API_PORT=str(REPLICA_API_PORT + i),
+                   DASHBOARD_WATCH_INBOX="1" if i == 0 else "0")
+        procs.append(subprocess.Popen([sys.executable, str(Path(__file__).resolve()),
+                                       "--server.port", str(REPLICA_PORT + i), *args], env=env))
+        print(f"[serve] replica {i}: dashboard :{REPLICA_PORT + i}, health :{REPLICA_HEALTH_PORT + i}, "
+              f"api :{REPLICA_API_PORT + i} (pid {procs[-1].pid})", flush=True)
+    if HEALTH_PORT:
+        serve_aggregate_health(n)
+
+    def stop(*_):
+        for p in procs:
+            if p.poll() is None:
+                p.terminate()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while all(p.poll() is None for p in procs):
+        time.sleep(1)
+    stop()
+    codes = [p.wait() for p in procs]
+    return next((c for c in codes if c), 0)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    replicas = int(os.environ.get("DASHBOARD_REPLICAS", "1"))
+    if "--replicas" in args:
+        i = args.index("--replicas")
+        replicas = int(args[i + 1])
+        del args[i:i + 2]
+    if replicas > 1:
+        sys.exit(run_replicas(replicas, args))
+
+    from streamlit.web import cli as stcli
+    from utils import snapshots, warmup
+    import api
+
+    snapshots.start_watcher()
+    warmup.start()
+    if api.API_PORT:
+        api.start(api.API_PORT)
+    sys.argv = ["streamlit", "run", str(HERE / "app.py"), *args]
+    sys.exit(stcli.main())
@@ -0,0 +1,45 @@
+# Histogram derived from the columnar store vs the one training writes from the CSV scores.
+#   cd frontend && python -m pytest tests
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import build_store                      # noqa: E402
+from utils import data, snapshots       # noqa: E402
+from utils.stats import RISK_BINS, risk_histogram, share_at_or_above   # noqa: E402
+
+
+def _scores(n_per_edge: int = 3) -> pd.DataFrame:
+    """4-decimal probabilities on every bin edge (0.57, 0.9, ...) plus a few just around them."""
+    edges = np.arange(RISK_BINS + 1) / RISK_BINS
+    p = np.round(np.concatenate([np.repeat(edges, n_per_edge), edges[1:] - 1e-4, edges[:-1] + 1e-4]), 4)
+    return pd.DataFrame({
+        "student_id": [f"S{i:05d}" for i in range(len(p))],
+        "school_id": "Sc001", "region": np.where(np.arange(len(p)) % 2, "Beirut", "North"),
+        "grade": 3, "subject": "Math", "modality": "Written", "sheet": "Math - Written",
+        "file": "Grade_3.xlsx", "risk_prob_below": p, "is_below": 0,
+    })
+
+
+def test_store_histogram_matches_csv_on_bin_edges(tmp_path, monkeypatch):
+    src = tmp_path / "student_risk_scores.csv"
+    _scores().to_csv(src, index=False, encoding="utf-8-sig")
+    build_store.build(src, tmp_path / "student_risk_scores.parquet",
+                      tmp_path / "student_risk_index.parquet", tmp_path / "student_risk_scores.arrow")
+    monkeypatch.setattr(snapshots, "BASE_DIR", tmp_path)
+    assert data.dataset_exists("student_risk_store")
+
+    # what train_risk_models_all.py writes to risk_hist_by_region_grade_subject.csv
+    expected = risk_histogram(pd.read_csv(src, encoding="utf-8-sig"))
+    derived = data.load_risk_hist()
+
+    keys = ["region", "grade", "subject", "bin"]
+    tidy = lambda h: h.astype({"region": str, "subject": str}).sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(tidy(derived), tidy(expected), check_dtype=False)
+    for thr in (0.57, 0.8, 0.9, 0.95):
+        got, want = share_at_or_above(derived, thr), share_at_or_above(expected, thr)
+        assert got["n_above"].tolist() == want["n_above"].tolist(), thr
@@ -127,3 +127,56 @@ def bar_horizontal(df: pd.DataFrame, x: str, y: str, title: str = ""):
         )
         .properties(height=max(28 * len(d), 120))
     )
+
+
+# ---------- Risk distributions (inputs are pre-aggregated in utils/query.py) ----------
+def risk_histogram_chart(hist: pd.DataFrame, thr: float = None, log: bool = False):
+    """Bars from risk_distribution() (bin edges lo/hi in 0–1), optional threshold rule."""
+    d = hist.assign(lo=100 * hist["lo"], hi=100 * hist["hi"])
+    y_scale = alt.Scale(type="symlog") if log else alt.Scale()
+    bars = (
+        alt.Chart(d)
+        .mark_bar()
+        .encode(
+            x=alt.X("lo:Q", title="Predicted risk (%)", scale=alt.Scale(domain=[0, 100])),
+            x2="hi:Q",
+            y=alt.Y("n:Q", title="Students" + (" (log scale)" if log else ""), scale=y_scale),
+            tooltip=[alt.Tooltip("lo:Q", title="From %", format=".0f"),
+                     alt.Tooltip("hi:Q", title="To %", format=".0f"),
+                     alt.Tooltip("n:Q", title="Students", format=",")],
+        )
+    )
+    if thr is None:
+        return bars.properties(height=260)
+    rule = alt.Chart(pd.DataFrame({"x": [100 * thr]})).mark_rule(color="red", strokeDash=[4, 3]).encode(x="x:Q")
+    return (bars + rule).properties(height=260)
+
+def risk_box_chart(box: pd.DataFrame, by: str = "region"):
+    """Box plot drawn from risk_box_stats() rows (whiskers, IQR box, median tick)."""
+    d = box.assign(**{c: 100 * box[c] for c in ["whisker_lo", "q1", "median", "q3", "whisker_hi", "mean"]})
+    y = alt.Y(f"{by}:N", sort=d[by].tolist(), title=None)
+    tooltip = [alt.Tooltip(f"{by}:N"), alt.Tooltip("n:Q", format=","),
+               alt.Tooltip("q1:Q", format=".1f"), alt.Tooltip("median:Q", format=".1f"),
+               alt.Tooltip("q3:Q", format=".1f"), alt.Tooltip("mean:Q", format=".1f")]
+    base = alt.Chart(d).encode(y=y, tooltip=tooltip)
+    whisker = base.mark_rule().encode(x=alt.X("whisker_lo:Q", title="Predicted risk (%)",
+                                              scale=alt.Scale(domain=[0, 100])), x2="whisker_hi:Q")
+    iqr = base.mark_bar(size=14, color="#4BA3F2").encode(x="q1:Q", x2="q3:Q")
+    median = base.mark_tick(color="black", size=14, thickness=2).encode(x="median:Q")
+    return (whisker + iqr + median).properties(height=max(28 * len(d), 120))
+
+def calibration_chart(cal: pd.DataFrame):
+    """Reliability curve from calibration_curve(): observed % below vs mean predicted risk."""
+    d = cal.assign(mean_pred=100 * cal["mean_pred"], frac_below=100 * cal["frac_below"])
+    diag = (alt.Chart(pd.DataFrame({"x": [0, 100], "y": [0, 100]}))
+            .mark_line(color="gray", strokeDash=[4, 3]).encode(x="x:Q", y="y:Q"))
+    base = alt.Chart(d).encode(
+        x=alt.X("mean_pred:Q", title="Mean predicted risk (%)", scale=alt.Scale(domain=[0, 100])),
+        y=alt.Y("frac_below:Q", title="Observed % below proficiency", scale=alt.Scale(domain=[0, 100])),
+        tooltip=[alt.Tooltip("mean_pred:Q", title="Predicted %", format=".1f"),
+                 alt.Tooltip("frac_below:Q", title="Observed %", format=".1f"),
+                 alt.Tooltip("n:Q", title="Students", format=",")],
+    )
+    points = base.mark_circle(opacity=0.8).encode(
+        size=alt.Size("n:Q", legend=None, scale=alt.Scale(type="sqrt", range=[20, 300])))
+    return (diag + base.mark_line() + points).properties(height=300)
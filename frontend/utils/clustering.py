@@ -0,0 +1,52 @@
+# frontend/utils/clustering.py
+# Interactive re-clustering for the Cluster page. Runs the region pipeline's own GMM fit and
+# High/Medium/Low naming (clusters_feature_dashboard/cluster_model.py, copied next to app.py in
+# the image) on the feature columns already in the clusters CSV.
+import sys
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+try:
+    import cluster_model as cm
+except ImportError:   # source checkout: use the clustering pipeline's copy
+    sys.path.append(str(Path(__file__).resolve().parents[2] / "clusters_feature_dashboard"))
+    import cluster_model as cm
+
+CACHE_ENTRIES   = 64          # LRU bound on cached fits (feature set × rows × k)
+
+FEATURE_COLS = [
+    "mean_z_avg","mean_z_ok","mean_z_size","composite_overall",
+    "subjects_covered","entries","strength_Arabic","strength_English","strength_French",
+]
+
+def _percentile_labels(composite: pd.Series):
+    return cm.percentile_labels(composite, *cm.percentile_cutoffs(composite))
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_ENTRIES)
+def recluster(feats: pd.DataFrame, columns: tuple, k: int) -> pd.DataFrame:
+    """
+    Fit RobustScaler + GMM(k) on `feats[columns]` and name clusters by mean composite.
+    Returns a frame aligned to `feats` with cluster_label and method ("gmm" or "percentile").
+    Cached on (rows, feature set, k), so revisiting a selection skips the fit.
+    """
+    from sklearn.preprocessing import RobustScaler
+
+    out = pd.DataFrame(index=feats.index)
+    composite = feats["composite_overall"]
+    if len(feats) <= k or not columns:
+        out["cluster_label"] = _percentile_labels(composite)
+        out["method"] = "percentile"
+        return out
+
+    X = RobustScaler().fit_transform(feats[list(columns)].fillna(0.0))
+    _, cid, counts = cm.fit_gmm(X, k)
+    if cm.is_imbalanced(counts):
+        out["cluster_label"] = _percentile_labels(composite)
+        out["method"] = "percentile"
+        return out
+
+    out["cluster_label"] = cm.name_clusters(composite, cid, k)[cid]
+    out["method"] = "gmm"
+    return out
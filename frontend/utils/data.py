@@ -1,28 +1,353 @@
+import json
 import os
+import threading
+from collections import OrderedDict
 import pandas as pd
-import streamlit as st
 from pathlib import Path
-import json
+
+from utils import snapshots
+from utils.stats import risk_histogram
 
 FRONTEND_DIR = Path(__file__).resolve().parents[1]
-DATA_DIR = FRONTEND_DIR / "data_proc"
 
-@st.cache_data
+# The data directory is the live snapshot (see utils/snapshots.py): a dropped-in bundle is
+# built in the background and swapped in atomically, so resolve it per call, never at import.
+# The inbox watcher is started by the server (serve.py / app.py), not by importing this module.
+
+def data_dir() -> Path:
+    return snapshots.current_dir()
+
+def data_version() -> str:
+    """Name of the live data snapshot; part of every cache key that depends on the data."""
+    return snapshots.current_version()
+
+# Loaded frames are shared by every session in the process (no per-call pickle copy like
+# st.cache_data), so treat them as read-only — filter/assign into new frames, never modify
+# in place.
+
+# ---------- Dataset registry ----------
+# Every data_proc artifact the pages read is declared once here: file, required columns,
+# dtypes, and whether it may be absent (optional -> empty frame with those columns).
+# Large per-student artifacts also name an "arrow" copy (published by build_store.py): when it
+# exists, slices are cut from the memory-mapped file, so replicas share one page-cache copy
+# instead of each holding the whole frame on its heap. "table" Parquet files are opened as
+# memory-mapped Arrow tables and only ever sliced, never converted whole to a frame.
+# load_dataset() parses a file on first use and keeps it until the file (or snapshot) changes;
+# every loader below goes through it, so one snapshot swap invalidates everything together.
+
+def _clean_student_risks(df: pd.DataFrame) -> pd.DataFrame:
+    # grade can arrive as text in older exports; risk_pct keeps 4 decimals so 0.9996 -> 99.96
+    df["grade"] = pd.to_numeric(df["grade"], errors="coerce")
+    df = df.dropna(subset=["grade"]).astype({"grade": int})
+    df["risk_pct"] = (df["risk_prob_below"] * 100).round(4)
+    return df.reset_index(drop=True)
+
+def _risk_offsets(idx: pd.DataFrame) -> dict:
+    """(grade, subject, region|None, school|None) -> (start, stop) rows in the presorted store."""
+    keys = zip(idx["grade"].astype(int), idx["subject"],
+               idx["region"].astype(object).where(idx["region"].notna(), None),
+               idx["school_id"].astype(object).where(idx["school_id"].notna(), None))
+    return dict(zip(keys, zip(idx["start"].astype(int), idx["stop"].astype(int))))
+
+RISK_STORE = "student_risk_scores.parquet"   # built by build_store.py
+RISK_ARROW = "student_risk_scores.arrow"     # same rows, uncompressed Arrow IPC
+RISK_INDEX = "student_risk_index.parquet"    # cohort offsets into the presorted rows
+
+DATASETS = {
+    "agg_region_grade_subject": {
+        "file": "agg_region_grade_subject.csv",
+        "columns": ["region", "grade", "subject", "avg_score", "pct_below", "n_students"],
+        "dtypes": {"grade": "int64", "avg_score": "float64", "pct_below": "float64", "n_students": "int64"},
+    },
+    "agg_region_grade_subject_domain": {
+        "file": "agg_region_grade_subject_domain.csv",
+        "columns": ["region", "grade", "subject", "domain", "avg_score", "pct_below", "n_students"],
+        "dtypes": {"grade": "int64", "avg_score": "float64", "pct_below": "float64", "n_students": "int64"},
+    },
+    "agg_gender": {
+        "file": "agg_gender.csv",
+        "columns": ["region", "grade", "subject", "pct_a", "pct_b", "gap_pp", "p_value", "n_a", "n_b"],
+        "dtypes": {"grade": "int64", "pct_a": "float64", "pct_b": "float64", "gap_pp": "float64",
+                   "p_value": "float64", "n_a": "int64", "n_b": "int64"},
+    },
+    "agg_gender_domain": {
+        "file": "agg_gender_domain.csv",
+        "columns": ["region", "grade", "subject", "domain", "pct_a", "pct_b", "gap_pp", "p_value", "n_a", "n_b"],
+        "dtypes": {"grade": "int64", "pct_a": "float64", "pct_b": "float64", "gap_pp": "float64",
+                   "p_value": "float64", "n_a": "int64", "n_b": "int64"},
+    },
+    "overlap": {
+        "file": "overlap.csv",
+        "columns": ["region", "grade", "subject", "focus_group", "avg_score", "pct_below", "gap_pp", "p_value", "n_group"],
+        "dtypes": {"grade": "int64", "avg_score": "float64", "pct_below": "float64", "gap_pp": "float64",
+                   "p_value": "float64"},
+    },
+    "overlap_domain": {
+        "file": "overlap_domain.csv", "optional": True,
+        "columns": ["region", "grade", "subject", "domain", "focus_group", "avg_score", "pct_below", "gap_pp", "p_value", "n_group"],
+        "dtypes": {"grade": "int64", "avg_score": "float64", "pct_below": "float64", "gap_pp": "float64",
+                   "p_value": "float64"},
+    },
+    "region_grade_clusters_hybrid": {
+        "file": "region_grade_clusters_hybrid.csv", "optional": True,
+        "columns": ["region_canonical", "grade", "cluster_label", "composite_overall"],
+        "dtypes": {},
+    },
+    "risk_by_region_grade_subject": {
+        "file": "risk_by_region_grade_subject.csv",
+        "columns": ["region", "grade", "subject", "avg_risk", "n_students"],
+        "dtypes": {"grade": "int64", "avg_risk": "float64", "n_students": "int64"},
+    },
+    "risk_hist_by_region_grade_subject": {
+        "file": "risk_hist_by_region_grade_subject.csv", "optional": True,
+        "columns": ["region", "grade", "subject", "bin", "n"],
+        "dtypes": {"grade": "int64", "bin": "int64", "n": "int64"},
+    },
+    "risk_model_coefficients": {
+        "file": "risk_model_coefficients.csv",
+        "columns": ["grade", "subject", "feature", "coef"],
+        "dtypes": {"coef": "float64"},
+    },
+    "risk_model_metrics": {"file": "risk_model_metrics.json", "optional": True},
+    "student_risk_scores": {
+        "file": "student_risk_scores.csv",
+        "columns": ["student_id", "school_id", "region", "grade", "subject", "modality", "risk_prob_below"],
+        "dtypes": {"student_id": "str", "school_id": "str", "risk_prob_below": "float64"},
+        "post": _clean_student_risks,
+    },
+    "student_risk_store": {   # the same rows presorted by cohort and risk (build_store.py)
+        "file": RISK_STORE, "optional": True, "arrow": RISK_ARROW, "table": True,
+        "columns": ["student_id", "school_id", "region", "grade", "subject", "risk_prob_below", "risk_pct"],
+    },
+    "student_risk_index": {
+        "file": RISK_INDEX, "optional": True,
+        "columns": ["grade", "subject", "region", "school_id", "start", "stop"],
+        "post": _risk_offsets,
+    },
+    "student_risk_drivers": {
+        "file": "student_risk_drivers.parquet", "optional": True, "arrow": "student_risk_drivers.arrow",
+        "columns": ["student_id", "grade", "subject", "modality"],
+    },
+    "student_cluster_centroids": {
+        "file": "student_cluster_centroids.csv", "optional": True,
+        "columns": ["grade", "subject", "modality", "cluster", "cluster_label", "domain", "centroid_pct"],
+        "dtypes": {},
+    },
+    "student_clusters": {
+        "file": "student_clusters.parquet", "optional": True, "arrow": "student_clusters.arrow", "table": True,
+        "columns": ["student_id", "school_id", "region", "grade", "subject", "modality", "cluster", "cluster_label"],
+    },
+}
+
+_MEMO = {}                     # name -> (signature, value), shared by all sessions
+_MEMO_LOCK = threading.Lock()
+
+def dataset_path(name: str) -> Path:
+    return data_dir() / DATASETS[name]["file"]
+
+def _signature(path: Path):
+    try:
+        st_ = path.stat()
+    except FileNotFoundError:
+        return None
+    return (str(path), st_.st_mtime_ns, st_.st_size)
+
+def _read(name: str, path: Path):
+    spec = DATASETS[name]
+    if path.suffix == ".json":
+        return json.loads(path.read_text(encoding="utf-8"))
+    if path.suffix == ".parquet" and spec.get("table"):
+        import pyarrow.parquet as pq
+        df = pq.read_table(path, memory_map=True)
+    elif path.suffix == ".parquet":
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, encoding="utf-8-sig", dtype=spec.get("dtypes") or None)
+    names = df.columns if isinstance(df, pd.DataFrame) else df.column_names
+    missing = [c for c in spec.get("columns", []) if c not in names]
+    if missing:
+        raise ValueError(f"{path.name}: missing columns {missing}")
+    return spec["post"](df) if "post" in spec else df
+
+def load_dataset(name: str):
+    """
+    The parsed artifact `name` from DATASETS. Parsed lazily on first use, then served from
+    memory until the file's path (snapshot), mtime or size change. Optional files that are absent come back
+    empty ([] for JSON, a frame with the declared columns otherwise).
+    """
+    return _load(name)[1]
+
+def _load(name: str) -> tuple:
+    """(signature, value) of a dataset; the signature doubles as its version in cache keys."""
+    spec, path = DATASETS[name], dataset_path(name)
+    sig = _signature(path)
+    hit = _MEMO.get(name)
+    if hit is not None and hit[0] == sig:
+        return hit
+    with _MEMO_LOCK:
+        hit = _MEMO.get(name)
+        if hit is not None and hit[0] == sig:
+            return hit
+        if sig is None:
+            if not spec.get("optional"):
+                raise FileNotFoundError(f"{path} not found (unpack data_proc first)")
+            value = [] if path.suffix == ".json" else pd.DataFrame(columns=spec.get("columns", []))
+        else:
+            value = _read(name, path)
+        _MEMO[name] = (sig, value)
+        return _MEMO[name]
+
+def dataset_exists(name: str) -> bool:
+    return dataset_path(name).exists()
+
+def dataset_table(name: str):
+    """(signature, memory-mapped Arrow table) of a dataset's "arrow" copy, or None if it has none."""
+    arrow = DATASETS[name].get("arrow")
+    path = data_dir() / arrow if arrow else None
+    sig = _signature(path) if path else None
+    if sig is None:
+        return None
+    key = name + ":arrow"
+    hit = _MEMO.get(key)
+    if hit is None or hit[0] != sig:
+        import pyarrow as pa
+        with _MEMO_LOCK:
+            # zero-copy: buffers point into the mapped file, shared with every other process
+            _MEMO[key] = hit = (sig, pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all())
+    return hit
+
+# ---------- Shared slice memo ----------
+# Pages keep asking for the same cohorts (grade × subject [× region/domain]) and option lists.
+# Results are memoised process-wide in one LRU keyed by (dataset version, filter tuple) and
+# bounded by their in-memory size, so a repeated selection skips the masking / unique() scan.
+# Like the loaders, the returned frames are shared: treat them as read-only.
+SLICE_MEMO_MB = float(os.environ.get("DASHBOARD_SLICE_MEMO_MB", "128"))
+
+def _nbytes(value) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return 64 + 32 * len(value)
+    return 64
+
+class SizedLRU:
+    """Thread-safe LRU of computed values, bounded by their total in-memory size (_nbytes)."""
+
+    def __init__(self, budget_mb: float):
+        self.budget = budget_mb * 2**20
+        self._items = OrderedDict()   # key -> (value, nbytes), least recently used first
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes": 0}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, compute):
+        """compute() once per key (which must include the data version), then serve it from the LRU."""
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is not None:
+                self._items.move_to_end(key)
+                self._stats["hits"] += 1
+                return hit[0]
+            self._stats["misses"] += 1
+        value = compute()   # outside the lock; two sessions racing on a miss just compute twice
+        size = _nbytes(value)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = (value, size)
+                self._stats["bytes"] += size
+            while self._stats["bytes"] > self.budget and len(self._items) > 1:
+                _, (_, old) = self._items.popitem(last=False)
+                self._stats["bytes"] -= old
+                self._stats["evictions"] += 1
+        return value
+
+    def peek(self, key: tuple):
+        """The memoised value for `key`, or None (without computing anything)."""
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None:
+                return None
+            self._items.move_to_end(key)
+            self._stats["hits"] += 1
+            return hit[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._items))
+
+_SLICES = SizedLRU(SLICE_MEMO_MB)
+
+def memoize_slice(key: tuple, compute):
+    return _SLICES.get(key, compute)
+
+def peek_slice(key: tuple):
+    return _SLICES.peek(key)
+
+def slice_memo_stats() -> dict:
+    return _SLICES.stats()
+
+def _filter_key(filters: dict) -> tuple:
+    return tuple(sorted((c, tuple(v) if isinstance(v, (list, tuple, set)) else v)
+                        for c, v in filters.items() if v is not None))
+
+def _apply_filters(df, key: tuple):
+    """Rows matching key; works on a DataFrame or an Arrow table (a slice of it comes back as a frame)."""
+    if not isinstance(df, pd.DataFrame):
+        return _arrow_filter(df, key).to_pandas()
+    mask = pd.Series(True, index=df.index)
+    for c, v in key:
+        mask &= df[c].isin(v) if isinstance(v, tuple) else (df[c] == v)
+    return df[mask]
+
+def _arrow_filter(table, key: tuple):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    mask = None
+    for c, v in key:
+        col = table.column(c)
+        if pa.types.is_dictionary(col.type):
+            col = col.cast(col.type.value_type)
+        m = pc.is_in(col, value_set=pa.array(v)) if isinstance(v, tuple) else pc.equal(col, v)
+        mask = m if mask is None else pc.and_(mask, m)
+    return table if mask is None else table.filter(mask)
+
+def _source(name: str) -> tuple:
+    """(version, rows) to slice from: the memory-mapped Arrow copy if published, else the frame."""
+    return dataset_table(name) or _load(name)
+
+def slice_dataset(name: str, **filters) -> pd.DataFrame:
+    """Rows of dataset `name` where column == value (a list/tuple means isin; None = no filter)."""
+    (version, df), key = _source(name), _filter_key(filters)
+    return memoize_slice(("slice", name, version, key), lambda: _apply_filters(df, key))
+
+def dataset_options(name: str, column: str, **filters) -> list:
+    """Sorted distinct non-null values of `column` within the matching rows (for selectboxes)."""
+    (version, df), key = _source(name), _filter_key(filters)
+    return memoize_slice(("options", name, version, column, key),
+                         lambda: sorted(_apply_filters(df, key)[column].dropna().unique().tolist()))
+
+# ---------- Page loaders ----------
 def load_region_subject() -> pd.DataFrame:
-    path = os.path.join(DATA_DIR, "agg_region_grade_subject.csv")
-    return pd.read_csv(path)
+    return load_dataset("agg_region_grade_subject")
 
+def load_region_domain() -> pd.DataFrame:
+    return load_dataset("agg_region_grade_subject_domain")
 
-@st.cache_data
 def load_gender() -> pd.DataFrame:
-    path = os.path.join(DATA_DIR, "agg_gender.csv")
-    return pd.read_csv(path)
+    return load_dataset("agg_gender")
 
+def load_gender_domain() -> pd.DataFrame:
+    return load_dataset("agg_gender_domain")
 
-@st.cache_data
 def load_overlap() -> pd.DataFrame:
-    path = os.path.join(DATA_DIR, "overlap.csv")
-    return pd.read_csv(path)
+    return load_dataset("overlap")
+
+def load_overlap_domain() -> pd.DataFrame:
+    return load_dataset("overlap_domain")
+
+def load_region_clusters() -> pd.DataFrame:
+    return load_dataset("region_grade_clusters_hybrid")
 
 
 def available_subjects(df: pd.DataFrame):
@@ -32,44 +357,118 @@ def available_subjects(df: pd.DataFrame):
 def available_grades(df: pd.DataFrame):
     return sorted(df["grade"].dropna().unique().tolist())
 
-@st.cache_data
-def load_student_risks() -> pd.DataFrame:
-    path = os.path.join(DATA_DIR, "student_risk_scores.csv")
-    return pd.read_csv(path, encoding="utf-8-sig")
+def widen_floats(df: pd.DataFrame) -> pd.DataFrame:
+    """float32 columns (risk_prob_below in the store) as float64 rounded to 6 decimals, so tables,
+    JSON and exports show 0.04 instead of 0.0399999991. For rows handed to users, not whole stores."""
+    f32 = [c for c in df.columns if df[c].dtype == "float32"]
+    return df.astype({c: "float64" for c in f32}).round({c: 6 for c in f32}) if f32 else df
+
+def risk_path(name: str, version: str = None) -> Path:
+    return (data_dir() if version is None else snapshots.version_dir(version)) / name
+
+def risk_table():
+    """The presorted risk store as an Arrow table (the shared memory-mapped copy when published)."""
+    return _source("student_risk_store")[1]
+
+def _risk_rows() -> tuple:
+    """(signature, rows) of the student scores: the columnar store if built, else the cleaned CSV."""
+    return _source("student_risk_store") if dataset_exists("student_risk_store") else _load("student_risk_scores")
+
+def has_risk_index() -> bool:
+    return dataset_exists("student_risk_store") and dataset_exists("student_risk_index")
+
+def load_student_risks(columns=None, grade=None, subject=None, region=None) -> pd.DataFrame:
+    """Student risk scores (with int grade and risk_pct), only `columns` and matching rows.
+
+    A grade + subject cohort is a slice of the memory-mapped presorted store (offset lookup,
+    no scan). Otherwise the store is filtered in Arrow, and without a store the CSV is parsed
+    and cleaned the same way. Results go through the shared slice memo.
+    """
+    columns = None if columns is None else list(columns)
+    key = _filter_key(dict(grade=grade, subject=subject, region=region))
+    sig, rows = _risk_rows()
+
+    def compute():
+        if isinstance(rows, pd.DataFrame):
+            df = _apply_filters(rows, key)
+            return df[columns or df.columns].reset_index(drop=True)
+        if has_risk_index() and grade is not None and subject is not None:
+            start, stop = load_dataset("student_risk_index").get((int(grade), subject, region, None), (0, 0))
+            part = rows.slice(start, stop - start)
+        else:
+            part = _arrow_filter(rows, key)
+        return (part if columns is None else part.select(columns)).to_pandas()
+
+    return memoize_slice(("student_risks", sig, None if columns is None else tuple(columns), key), compute)
+
+def cohort_size(grade, subject, region=None, school=None) -> int:
+    start, stop = load_dataset("student_risk_index").get((int(grade), subject, region, school), (0, 0))
+    return stop - start
+
+def top_risks(grade, subject, region=None, school=None, k=150, offset=0, columns=None) -> pd.DataFrame:
+    """
+    Students ranked offset..offset+k by descending risk within a cohort, read from the
+    presorted store: one offset lookup plus a k-row slice/take, no filtering or sorting.
+    Requires has_risk_index(); ties are broken by student_id like the query engine.
+    """
+    table = risk_table()
+    start, stop = load_dataset("student_risk_index").get((int(grade), subject, region, school), (0, 0))
+    lo, hi = min(start + offset, stop), min(start + offset + k, stop)
+    if school is not None:
+        rows = table.slice(lo, hi - lo)          # school blocks are stored in risk order
+    else:
+        order = table.column("ord_gsr" if region is not None else "ord_gs")
+        rows = table.take(order.slice(lo, hi - lo))
+    if columns is not None:
+        rows = rows.select(list(columns))
+    return widen_floats(rows.to_pandas())
+
 
-@st.cache_data
 def load_risk_cohort() -> pd.DataFrame:
-    path = os.path.join(DATA_DIR, "risk_by_region_grade_subject.csv")
-    return pd.read_csv(path, encoding="utf-8-sig")
+    return load_dataset("risk_by_region_grade_subject")
+
+def load_risk_hist() -> pd.DataFrame:
+    """Students per risk bin per region × grade × subject (risk_hist_by_region_grade_subject.csv).
+
+    Older data_proc bundles lack the file; the histogram is then derived once from the
+    student scores, so the Triage threshold slider works either way.
+    """
+    if dataset_exists("risk_hist_by_region_grade_subject"):
+        return load_dataset("risk_hist_by_region_grade_subject")
+    return _derived_risk_hist()
+
+def slice_risk_hist(grade, subject, region=None) -> pd.DataFrame:
+    """load_risk_hist() rows for one cohort, through the shared slice memo."""
+    filters = dict(grade=grade, subject=subject, region=region)
+    if dataset_exists("risk_hist_by_region_grade_subject"):
+        return slice_dataset("risk_hist_by_region_grade_subject", **filters)
+    key = _filter_key(filters)
+    return memoize_slice(("slice", "derived_risk_hist", _risk_rows()[0], key),
+                         lambda: _apply_filters(_derived_risk_hist(), key))
+
+def _derived_risk_hist() -> pd.DataFrame:
+    # binned from the float64 risk_pct (4 dp, like the CSV): the store's float32 risk_prob_below
+    # sits just under bin edges (0.9 -> 0.89999998) and would count those students one bin low
+    def compute():
+        risks = load_student_risks(["region", "grade", "subject", "risk_pct"])
+        return risk_histogram(risks.assign(risk_prob_below=risks["risk_pct"] / 100))
+    return memoize_slice(("derived_risk_hist", _risk_rows()[0]), compute)
 
-@st.cache_data
 def load_risk_coeffs() -> pd.DataFrame:
-    path = os.path.join(DATA_DIR, "risk_model_coefficients.csv")
-    return pd.read_csv(path, encoding="utf-8-sig")
+    return load_dataset("risk_model_coefficients")
+
+def load_risk_drivers() -> pd.DataFrame:
+    """Per-student top risk drivers from training; empty if the file was not produced."""
+    return load_dataset("student_risk_drivers")
+
+def load_student_clusters(grade=None, region=None, school=None) -> pd.DataFrame:
+    """Student-level weakness-profile clusters for a grade / region / school; empty if absent."""
+    return slice_dataset("student_clusters", grade=grade, region=region, school_id=school)
+
+def load_student_cluster_centroids() -> pd.DataFrame:
+    return load_dataset("student_cluster_centroids")
 
-@st.cache_data
 def load_risk_metrics() -> list:
-    path = os.path.join(DATA_DIR, "risk_model_metrics.json")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def _find_data(path_str: str):
-    """Try common locations for data_proc/* regardless of how Streamlit was launched."""
-    here = Path(__file__).resolve()
-    candidates = [
-        Path(path_str),                         # as-is
-        Path.cwd() / path_str,                  # from current working dir
-        here.parents[2] / path_str,             # repo root (…/frontend/utils -> up 2)
-        here.parents[1] / path_str,             # …/frontend
-    ]
-    for p in candidates:
-        if p.exists():
-            return p
-    return None
-
-def load_risk_metrics():
-    p = _find_data("data_proc/risk_model_metrics.json")
-    if p is None:
-        return []
-    import json
-    return json.loads(Path(p).read_text(encoding="utf-8"))
+    """Per-cohort model metrics from training; [] if the file was not produced."""
+    metrics = load_dataset("risk_model_metrics")
+    return metrics["cohorts"] if isinstance(metrics, dict) else metrics   # older bundles: a plain list
@@ -0,0 +1,91 @@
+# frontend/utils/exports.py
+# On-demand downloads. Pages pass a zero-argument source (a DataFrame or an iterator of
+# DataFrame chunks) instead of pre-serialised bytes, so ordinary reruns pay nothing; the
+# file is written chunk by chunk only after "Prepare" is clicked, then kept under (data
+# version, export key, filter key, format) for every session asking for it. Export bytes get their own
+# small LRU, so one large cohort download never evicts the page slices.
+import io
+import os
+import zipfile
+
+import pandas as pd
+import streamlit as st
+
+from utils.data import SizedLRU, data_version
+
+CHUNK_ROWS = 50_000
+EXPORT_MEMO_MB = float(os.environ.get("DASHBOARD_EXPORT_MEMO_MB", "64"))
+
+_EXPORTS = SizedLRU(EXPORT_MEMO_MB)   # serialized files, separate from the page slice memo
+
+# label -> (file extension, MIME type)
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (zip)": (".zip", "application/zip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def _chunks(source):
+    data = source()
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, max(len(data), 1), CHUNK_ROWS):
+            yield data.iloc[start:start + CHUNK_ROWS]
+    else:
+        yield from data
+
+
+def _write_csv(chunks, out) -> None:
+    first = True
+    for chunk in chunks:
+        # utf-8-sig for the first chunk only: one BOM so Excel reads Arabic names correctly
+        out.write(chunk.to_csv(index=False, header=first).encode("utf-8-sig" if first else "utf-8"))
+        first = False
+
+
+def _write_parquet(chunks, out) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False,
+                                     schema=writer.schema if writer is not None else None)
+        if writer is None:
+            writer = pq.ParquetWriter(out, table.schema, compression="zstd")
+        writer.write_table(table)
+    if writer is not None:
+        writer.close()
+
+
+def serialize(source, fmt: str, name: str = "export") -> bytes:
+    """Write `source` (DataFrame or chunk iterator, via a callable) in one of FORMATS."""
+    out = io.BytesIO()
+    if fmt == "CSV":
+        _write_csv(_chunks(source), out)
+    elif fmt == "CSV (zip)":
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf, \
+             zf.open(f"{name}.csv", "w") as member:
+            _write_csv(_chunks(source), member)
+    elif fmt == "Parquet":
+        _write_parquet(_chunks(source), out)
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
+    return out.getvalue()
+
+
+def export_button(label: str, source, file_name: str, key: str, cache_key: tuple, formats=tuple(FORMATS)):
+    """
+    Format picker + "Prepare" button that turns into a download button once the file exists.
+    `source` is only called on Prepare; `key` names the export (unique across pages, used for
+    the widgets and the memo) and `cache_key` must identify the exported rows (filters).
+    """
+    c1, c2 = st.columns([1, 3])
+    fmt = c1.selectbox("Format", formats, key=f"export:{key}:fmt", label_visibility="collapsed")
+    ext, mime = FORMATS[fmt]
+    memo_key = ("export", data_version(), key, cache_key, fmt)
+    data = _EXPORTS.peek(memo_key)
+    if data is None and c2.button(f"Prepare {label.lower()}", key=f"export:{key}:prepare"):
+        with st.spinner("Preparing download…"):
+            data = _EXPORTS.get(memo_key, lambda: serialize(source, fmt, file_name))
+    if data is not None:
+        c2.download_button(label, data, file_name=file_name + ext, mime=mime, key=f"export:{key}:download")
@@ -0,0 +1,170 @@
+# frontend/utils/query.py
+# Query layer for per-student pages. DuckDB runs filters, search, sort and LIMIT/OFFSET
+# directly over the Parquet risk store (or the CSV when the store is missing), so a page
+# request only materialises the rows it shows; ORDER BY ... LIMIT runs as a top-k.
+import os
+import duckdb
+import pandas as pd
+import streamlit as st
+
+from utils.data import RISK_ARROW, RISK_STORE, data_version, memoize_slice, risk_path, risk_table, widen_floats
+
+SORTABLE = {"risk_prob_below", "student_id", "school_id", "region"}
+GROUPABLE = {"region", "school_id", "grade", "subject", "modality"}
+
+
+@st.cache_resource(max_entries=2)
+def _connection(version: str):
+    # one connection per data snapshot; the view points at that snapshot's files
+    con = duckdb.connect()
+    if risk_path(RISK_ARROW, version).exists():
+        return con   # _cursor() registers the shared Arrow table per cursor
+    store = risk_path(RISK_STORE, version)
+    if store.exists():
+        src = f"read_parquet('{store.as_posix()}')"
+    else:
+        src = (f"(SELECT *, round(risk_prob_below * 100, 4) AS risk_pct FROM "
+               f"read_csv_auto('{risk_path('student_risk_scores.csv', version).as_posix()}', header=true))")
+    con.execute(f"CREATE VIEW risks AS SELECT * FROM {src}")
+    return con
+
+
+def _cursor():
+    """A cursor per call (DuckDB connections are not shared across threads)."""
+    version = data_version()
+    cur = _connection(version).cursor()
+    if risk_path(RISK_ARROW, version).exists():
+        # scan the memory-mapped Arrow table in place, no second copy of the data;
+        # registrations are cursor-local, and registering is just a pointer hand-off
+        cur.register("risks", risk_table())
+    return cur
+
+
+def _where(grade=None, subject=None, region=None, school=None, class_name=None, search=None):
+    # plain column = value comparisons, so DuckDB can push them into the Parquet row-group scan
+    clauses, params = [], []
+    for col, val in [("grade", grade), ("subject", subject), ("region", region),
+                     ("school_id", school), ("class_name", class_name)]:
+        if val is not None:
+            clauses.append(f"{col} = ?")
+            params.append(int(val) if col == "grade" else str(val))
+    if search:
+        clauses.append("contains(lower(CAST(student_id AS VARCHAR)), ?)")
+        params.append(search.lower())
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _memo_key(kind: str, *args, **filters) -> tuple:
+    return ("query", kind, data_version(), *args, tuple(sorted(filters.items())))
+
+
+def available_columns() -> list:
+    return memoize_slice(_memo_key("columns"),
+                         lambda: [r[0] for r in _cursor().execute("DESCRIBE risks").fetchall()])
+
+
+def count_students(**filters) -> int:
+    where, params = _where(**filters)
+    return memoize_slice(_memo_key("count", **filters), lambda: _cursor().execute(
+        f"SELECT count(*) FROM risks {where}", params).fetchone()[0])
+
+
+def distinct_values(column: str, **filters) -> list:
+    """Sorted non-null values of `column` among the rows matching `filters` (memoised per snapshot)."""
+    where, params = _where(**filters)
+    where = (where + " AND " if where else "WHERE ") + f"{column} IS NOT NULL"
+    sql = f"SELECT DISTINCT CAST({column} AS VARCHAR) AS v FROM risks {where} ORDER BY v"
+    return memoize_slice(_memo_key("distinct", column, **filters),
+                         lambda: [v for (v,) in _cursor().execute(sql, params).fetchall()])
+
+
+def _page_sql(columns, order_by, descending, limit, offset, filters):
+    if order_by not in SORTABLE:
+        raise ValueError(f"cannot sort by {order_by!r}")
+    where, params = _where(**filters)
+    cols = ", ".join(columns)
+    # student_id breaks ties so pages never overlap or skip rows
+    sql = (f"SELECT {cols} FROM risks {where} "
+           f"ORDER BY {order_by} {'DESC' if descending else 'ASC'}, student_id")
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params = params + [int(limit), int(offset)]
+    return sql, params
+
+
+def student_page(columns, order_by="risk_prob_below", descending=True,
+                 limit=None, offset=0, **filters) -> pd.DataFrame:
+    """
+    One page of students matching `filters`, sorted in the engine.
+    limit=None returns every matching row.
+    """
+    sql, params = _page_sql(columns, order_by, descending, limit, offset, filters)
+    return widen_floats(_cursor().execute(sql, params).df())
+
+
+def student_batches(columns, order_by="risk_prob_below", descending=True, batch_rows=50_000, **filters):
+    """Every student matching `filters`, in page order, as DataFrames of at most batch_rows (for exports)."""
+    sql, params = _page_sql(columns, order_by, descending, None, 0, filters)
+    cur = _cursor().execute(sql, params)
+    # to_arrow_reader() replaces fetch_record_batch() in newer DuckDB releases
+    reader = (cur.to_arrow_reader if hasattr(cur, "to_arrow_reader") else cur.fetch_record_batch)(batch_rows)
+    for batch in reader:
+        yield widen_floats(batch.to_pandas())
+
+
+# ---------- Pre-aggregated risk distributions ----------
+# Charts get a few dozen rows per view (bins / groups), never one point per student.
+
+def _bin_expr(bins: int) -> str:
+    return f"least(CAST(floor(risk_prob_below * {int(bins)}) AS INTEGER), {int(bins) - 1})"
+
+
+def risk_distribution(bins: int = 20, **filters) -> pd.DataFrame:
+    """Students per risk bin among the matching rows: bin, lo, hi (0-1), n; empty bins included."""
+    def compute():
+        where, params = _where(**filters)
+        got = _cursor().execute(
+            f"SELECT {_bin_expr(bins)} AS bin, count(*) AS n FROM risks {where} GROUP BY 1", params).df()
+        out = pd.DataFrame({"bin": range(bins)}).merge(got, on="bin", how="left").fillna({"n": 0})
+        return out.assign(lo=out["bin"] / bins, hi=(out["bin"] + 1) / bins, n=out["n"].astype(int))
+    return memoize_slice(_memo_key("risk_distribution", bins, **filters), compute)
+
+
+def risk_box_stats(by: str = "region", **filters) -> pd.DataFrame:
+    """
+    Five-number summary of risk per `by` group: n, mean, q1, median, q3, and whiskers at the
+    1.5 × IQR fences clipped to the group's min/max. Sorted by median risk, highest first.
+    """
+    if by not in GROUPABLE:
+        raise ValueError(f"cannot group by {by!r}")
+
+    def compute():
+        where, params = _where(**filters)
+        sql = (f"SELECT CAST({by} AS VARCHAR) AS {by}, count(*) AS n, avg(risk_prob_below) AS mean, "
+               f"min(risk_prob_below) AS min, max(risk_prob_below) AS max, "
+               f"quantile_cont(risk_prob_below, 0.25) AS q1, quantile_cont(risk_prob_below, 0.5) AS median, "
+               f"quantile_cont(risk_prob_below, 0.75) AS q3 "
+               f"FROM risks {where} GROUP BY 1 ORDER BY median DESC, 1")
+        out = _cursor().execute(sql, params).df()
+        iqr = out["q3"] - out["q1"]
+        out["whisker_lo"] = (out["q1"] - 1.5 * iqr).clip(lower=out["min"])
+        out["whisker_hi"] = (out["q3"] + 1.5 * iqr).clip(upper=out["max"])
+        return out
+    return memoize_slice(_memo_key("risk_box_stats", by, **filters), compute)
+
+
+def calibration_curve(bins: int = 10, **filters) -> pd.DataFrame:
+    """
+    Reliability table: per predicted-risk bin, mean risk_prob_below vs observed share with
+    is_below = 1 (bin, n, mean_pred, frac_below). Empty if the scores carry no is_below.
+    """
+    if "is_below" not in available_columns():
+        return pd.DataFrame(columns=["bin", "n", "mean_pred", "frac_below"])
+
+    def compute():
+        where, params = _where(**filters)
+        where = (where + " AND " if where else "WHERE ") + "is_below IS NOT NULL"
+        sql = (f"SELECT {_bin_expr(bins)} AS bin, count(*) AS n, avg(risk_prob_below) AS mean_pred, "
+               f"avg(CAST(is_below AS DOUBLE)) AS frac_below FROM risks {where} GROUP BY 1 ORDER BY 1")
+        return _cursor().execute(sql, params).df()
+    return memoize_slice(_memo_key("calibration_curve", bins, **filters), compute)
@@ -0,0 +1,176 @@
+# frontend/utils/snapshots.py
+# Versioned data snapshots with background refresh, so new data_proc artifacts go live
+# without rebuilding the image or restarting the dashboard.
+#
+#   data_snapshots/
+#     CURRENT                  one line: the live snapshot name (repointed with os.replace)
+#     20261019-184500-1a2b3c/  full data_proc contents + columnar store and index
+#   data_inbox/data_proc.zip   drop a new bundle here (a zip or a data_proc/ folder)
+#
+# A daemon thread polls the inbox. A new or changed bundle (left unchanged for one poll, so
+# a copy in progress is not picked up) is unpacked and built (see
+# build_store.py) in a hidden ".building-*" directory, renamed into place, and only then is
+# CURRENT repointed. Readers resolve the live snapshot on every call and caches are keyed
+# by its name, so sessions move to the new data on their next rerun, keep getting the old
+# snapshot while the build runs, and never see a half-written file.
+# Until the first snapshot is published, the data_proc/ baked into the image is used.
+#
+#   python -m utils.snapshots path/to/data_proc.zip     # publish by hand (from frontend/)
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+FRONTEND_DIR = Path(__file__).resolve().parents[1]
+BASE_DIR = FRONTEND_DIR / "data_proc"
+SNAPSHOT_DIR = Path(os.environ.get("DASHBOARD_SNAPSHOTS", FRONTEND_DIR / "data_snapshots"))
+INBOX = Path(os.environ.get("DASHBOARD_INBOX", FRONTEND_DIR / "data_inbox"))
+POLL_SECONDS = float(os.environ.get("DASHBOARD_POLL_SECONDS", "10"))
+WATCH_INBOX = os.environ.get("DASHBOARD_WATCH_INBOX", "1") != "0"   # one publisher per host (serve.py --replicas)
+KEEP_SNAPSHOTS = 3          # live one + a couple of previous ones (sessions mid-rerun may hold them)
+BASE_VERSION = "base"
+SOURCE_FILE = ".source"     # inside a snapshot: "<bundle name> <signature>" it was built from
+
+_pointer = {"sig": None, "version": BASE_VERSION}
+_watcher_lock = threading.Lock()
+_watcher = None
+
+
+def current_version() -> str:
+    """Name of the live snapshot ("base" = the image's data_proc/). One stat() when unchanged."""
+    ptr = SNAPSHOT_DIR / "CURRENT"
+    try:
+        st_ = ptr.stat()
+    except FileNotFoundError:
+        return BASE_VERSION
+    sig = (st_.st_mtime_ns, st_.st_size, st_.st_ino)
+    if sig != _pointer["sig"]:
+        name = ptr.read_text(encoding="utf-8").strip()
+        _pointer.update(sig=sig, version=name if (SNAPSHOT_DIR / name).is_dir() else BASE_VERSION)
+    return _pointer["version"]
+
+
+def version_dir(version: str) -> Path:
+    return BASE_DIR if version == BASE_VERSION else SNAPSHOT_DIR / version
+
+
+def current_dir() -> Path:
+    return version_dir(current_version())
+
+
+def _bundle_signature(path: Path):
+    """Cheap change detector for a bundle: (name, size, mtime) of it or of every file inside."""
+    if path.is_file():
+        files = [path]
+    else:
+        files = sorted(p for p in path.rglob("*") if p.is_file())
+    h = hashlib.sha1()
+    for p in files:
+        st_ = p.stat()
+        h.update(f"{p.relative_to(path.parent)}|{st_.st_size}|{st_.st_mtime_ns}\n".encode())
+    return h.hexdigest()[:6] if files else None
+
+
+def _unpack(src: Path, dst: Path) -> None:
+    """Copy a bundle into dst; like the Dockerfile, accepts data_proc/* or files at the root."""
+    stage = dst.parent / (dst.name + ".unpack")
+    if src.is_file():
+        with zipfile.ZipFile(src) as zf:
+            zf.extractall(stage)
+    else:
+        shutil.copytree(src, stage)
+    inner = stage / "data_proc" if (stage / "data_proc").is_dir() else stage
+    for p in inner.iterdir():
+        shutil.move(str(p), dst / p.name)
+    shutil.rmtree(stage, ignore_errors=True)
+
+
+def publish(src: Path) -> str:
+    """Build a snapshot from a bundle (zip or folder) and make it live. Returns its name."""
+    import build_store   # frontend/build_store.py
+
+    src = Path(src)
+    sig = _bundle_signature(src)
+    version = time.strftime("%Y%m%d-%H%M%S") + "-" + (sig or "empty")
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    work = SNAPSHOT_DIR / f".building-{version}"
+    shutil.rmtree(work, ignore_errors=True)
+    work.mkdir()
+    try:
+        _unpack(src, work)
+        if (work / "student_risk_scores.csv").exists():
+            build_store.build(src=work / "student_risk_scores.csv",
+                              dst=work / "student_risk_scores.parquet",
+                              dst_index=work / "student_risk_index.parquet",
+                              dst_arrow=work / "student_risk_scores.arrow")
+        build_store.publish_arrow_copies(work)
+        (work / SOURCE_FILE).write_text(f"{src.name} {sig}\n", encoding="utf-8")
+        os.replace(work, SNAPSHOT_DIR / version)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+
+    tmp = SNAPSHOT_DIR / "CURRENT.tmp"
+    tmp.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp, SNAPSHOT_DIR / "CURRENT")   # the atomic switch
+    _prune(keep=version)
+    return version
+
+
+def _prune(keep: str) -> None:
+    snaps = sorted(p for p in SNAPSHOT_DIR.iterdir() if p.is_dir() and not p.name.startswith("."))
+    for old in snaps[:-KEEP_SNAPSHOTS]:
+        if old.name != keep:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _published_sources() -> set:
+    """(bundle name, signature) of every snapshot on disk, so a restart does not rebuild them."""
+    out = set()
+    for src in SNAPSHOT_DIR.glob(f"*/{SOURCE_FILE}") if SNAPSHOT_DIR.is_dir() else []:
+        name, _, sig = src.read_text(encoding="utf-8").strip().rpartition(" ")
+        out.add((name, sig))
+    return out
+
+
+def _watch() -> None:
+    published = _published_sources()
+    last_seen = {}   # bundle name -> signature at the previous poll
+    while True:
+        try:
+            for bundle in sorted(INBOX.iterdir()) if INBOX.is_dir() else []:
+                if bundle.name.startswith(".") or not (bundle.suffix == ".zip" or bundle.is_dir()):
+                    continue
+                sig = _bundle_signature(bundle)
+                stable = sig is not None and last_seen.get(bundle.name) == sig
+                last_seen[bundle.name] = sig
+                if not stable or (bundle.name, sig) in published:
+                    continue
+                published.add((bundle.name, sig))   # a failed build is not retried until the bundle changes
+                print(f"[snapshots] publishing {bundle} ...", flush=True)
+                print(f"[snapshots] live: {publish(bundle)}", flush=True)
+        except Exception as exc:   # keep serving the current snapshot; retry next poll
+            print(f"[snapshots] refresh failed: {exc!r}", file=sys.stderr, flush=True)
+        time.sleep(POLL_SECONDS)
+
+
+def start_watcher() -> None:
+    """Start the inbox watcher once per process (no-op if it is already running or disabled)."""
+    global _watcher
+    if not WATCH_INBOX:
+        return   # another replica publishes; this one only follows CURRENT
+    with _watcher_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = threading.Thread(target=_watch, name="data-snapshot-watcher", daemon=True)
+            _watcher.start()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        raise SystemExit("usage: python -m utils.snapshots <data_proc.zip | data_proc folder>")
+    sys.path.insert(0, str(FRONTEND_DIR))
+    print(f"live: {publish(Path(sys.argv[1]))}")
@@ -1,5 +1,6 @@
 # frontend/utils/stats.py
 import re
+import numpy as np
 import pandas as pd
 
 def kpi_row(items):
@@ -65,6 +66,45 @@ def aggregate_domain_importance(coef_df: pd.DataFrame) -> pd.DataFrame:
     )
     return out
 
+def format_drivers(df: pd.DataFrame) -> pd.Series:
+    """
+    Collapse driver_1..driver_k (+ *_contrib) columns into one readable string per row,
+    e.g. 'Writing (+1.21) · Reading Comprehension (+0.40)'.
+    """
+    k = 1
+    parts = []
+    while f"driver_{k}" in df.columns:
+        name, val = df[f"driver_{k}"], df[f"driver_{k}_contrib"]
+        parts.append((name.astype(object) + " (+" + val.round(2).astype(str) + ")").where(name.notna(), ""))
+        k += 1
+    if not parts:
+        return pd.Series("", index=df.index)
+    return pd.concat(parts, axis=1).apply(lambda r: " · ".join(p for p in r if p), axis=1)
+
+# ---------- Threshold-agnostic risk shares ----------
+
+RISK_BINS = 100  # must match RISK_HIST_BINS in train_risk_models_all.py
+
+def risk_histogram(risks: pd.DataFrame, bins: int = RISK_BINS) -> pd.DataFrame:
+    """Count students per risk bin (bin b covers [b, b+1)/bins) per region × grade × subject."""
+    p = risks["risk_prob_below"].to_numpy(dtype=float)
+    b = np.minimum(np.floor(p * bins + 1e-9), bins - 1).astype(int)
+    return (risks[["region", "grade", "subject"]].assign(bin=b)
+                 .groupby(["region", "grade", "subject", "bin"], observed=True).size()
+                 .rename("n").reset_index())
+
+def share_at_or_above(hist: pd.DataFrame, thr: float, by=("region",), bins: int = RISK_BINS) -> pd.DataFrame:
+    """
+    Students at or above a risk threshold from a risk histogram, O(bins) per group.
+
+    Returns columns [*by, 'n_above', 'n', 'pct_above'] (pct in 0–100).
+    """
+    cut = int(round(thr * bins))
+    out = (hist.assign(n_above=hist["n"].where(hist["bin"] >= cut, 0))
+               .groupby(list(by), as_index=False)[["n_above", "n"]].sum())
+    out["pct_above"] = (100 * out["n_above"] / out["n"]).round(1)
+    return out
+
 def pretty_label(s: str) -> str:
     """Optional: cleaner labels for any item strings you DO decide to show."""
     s = str(s)
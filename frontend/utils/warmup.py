@@ -0,0 +1,147 @@
+# frontend/utils/warmup.py
+# Background prewarm for a fast cold start. Once per server process (serve.py starts it
+# before Streamlit; app.py as a fallback) a daemon thread imports the chart/model libraries
+# and loads every data_proc artifact, the memory-mapped risk store, its offset index and the
+# query engine into the process-wide caches, so the first visitor of each page hits warm
+# data. It re-warms whenever a new data snapshot goes live.
+#
+# GET http://<host>:8502/healthz  ->  200 when warm (503 while warming), JSON body:
+#   status, data_version, startup_seconds (process start -> warm), warmup_seconds, steps,
+#   errors, first_render_ms / last_render_ms per page (see render_started).
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STARTED_AT = float(os.environ.get("DASHBOARD_STARTED_AT", time.time()))   # set by serve.py
+HEALTH_PORT = int(os.environ.get("DASHBOARD_HEALTH_PORT", "8502"))        # 0 disables the endpoint
+HEAVY_MODULES = ["pyarrow", "duckdb", "altair", "plotly.express", "sklearn.mixture", "sklearn.preprocessing"]
+
+_LOCK = threading.Lock()
+_STATE = {"status": "idle", "data_version": None, "startup_seconds": None, "warmup_seconds": None,
+          "steps": {}, "errors": {}, "first_render_ms": {}, "last_render_ms": {}}
+_started = False
+_render = threading.local()   # per script-runner thread: (page, perf_counter at the page's top)
+
+
+def _step(name: str, fn, steps: dict, errors: dict) -> None:
+    t0 = time.perf_counter()
+    try:
+        fn()
+    except Exception as exc:   # a missing optional artifact must not stop the rest
+        errors[name] = repr(exc)
+    steps[name] = round(time.perf_counter() - t0, 3)
+
+
+def warm() -> None:
+    """Load everything the pages read for the live snapshot into the shared caches."""
+    import importlib
+    from utils import data, query
+
+    version = data.data_version()
+    with _LOCK:
+        _STATE.update(status="warming", data_version=version)
+    steps, errors = {}, {}
+    t0 = time.perf_counter()
+
+    _step("imports", lambda: [importlib.import_module(m) for m in HEAVY_MODULES], steps, errors)
+    indexed = data.has_risk_index()
+    for name in data.DATASETS:
+        if data.DATASETS[name].get("arrow") and (data.data_dir() / data.DATASETS[name]["arrow"]).exists():
+            # map the shared Arrow copy; the full frame never needs to be on this process's heap
+            _step(f"arrow:{name}", lambda n=name: data.dataset_table(n), steps, errors)
+        elif name == "student_clusters" or (name == "student_risk_scores" and indexed):
+            continue   # read with filters per request / superseded by the columnar store
+        else:
+            _step(f"dataset:{name}", lambda n=name: data.load_dataset(n), steps, errors)
+    _step("risk_hist", data.load_risk_hist, steps, errors)
+    _step("query_engine", query.available_columns, steps, errors)
+
+    with _LOCK:
+        _STATE.update(status="ready", steps=steps, errors=errors,
+                      warmup_seconds=round(time.perf_counter() - t0, 3))
+        if _STATE["startup_seconds"] is None:
+            _STATE["startup_seconds"] = round(time.time() - STARTED_AT, 3)
+    print(f"[warmup] snapshot {version} warm in {_STATE['warmup_seconds']:.2f}s "
+          f"(process start -> ready {_STATE['startup_seconds']:.2f}s)"
+          + (f", {len(errors)} step(s) failed: {sorted(errors)}" if errors else ""), flush=True)
+
+
+def _run() -> None:
+    from utils import data, snapshots
+    # cached loaders called outside a script run warn about the missing ScriptRunContext
+    for name in ("streamlit.runtime.scriptrunner_utils.script_run_context",
+                 "streamlit.runtime.scriptrunner.script_run_context"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    while True:
+        if data.data_version() != _STATE["data_version"] or _STATE["status"] != "ready":
+            try:
+                warm()
+            except Exception as exc:
+                with _LOCK:
+                    _STATE.update(status="failed", errors={"warmup": repr(exc)})
+                print(f"[warmup] failed: {exc!r}", file=sys.stderr, flush=True)
+        time.sleep(snapshots.POLL_SECONDS)
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("/healthz", ""):
+            self.send_error(404)
+            return
+        body = json.dumps(status()).encode("utf-8")
+        self.send_response(200 if _STATE["status"] == "ready" else 503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):   # keep probes out of the server log
+        pass
+
+
+def start() -> None:
+    """Start the prewarm thread and the health endpoint once per process."""
+    global _started
+    with _LOCK:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_run, name="dashboard-warmup", daemon=True).start()
+    if HEALTH_PORT:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", HEALTH_PORT), _HealthHandler)
+        except OSError as exc:   # e.g. a second dashboard on the same host
+            print(f"[warmup] health endpoint disabled: {exc}", file=sys.stderr, flush=True)
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="dashboard-health", daemon=True).start()
+
+
+def record_render(page: str, started: float) -> None:
+    """Log how long a page script took (time.perf_counter() at its top -> now)."""
+    ms = round(1000 * (time.perf_counter() - started), 1)
+    with _LOCK:
+        _STATE["first_render_ms"].setdefault(page, ms)
+        _STATE["last_render_ms"][page] = ms
+
+
+def render_started(page: str) -> None:
+    """First line of a page script; render_done() at its end records the render time."""
+    _render.page = (page, time.perf_counter())
+
+
+def render_done() -> None:
+    """Last line of a page script (a run that ends in st.stop() is not recorded)."""
+    started = getattr(_render, "page", None)
+    if started is not None:
+        _render.page = None
+        record_render(*started)
+
+
+def status() -> dict:
+    with _LOCK:
+        return json.loads(json.dumps(_STATE))   # deep copy